@@ -0,0 +1,271 @@
+"""Benchmarks of the OrbitDisplay hot path.
+
+Drives session construction, update, reference collection and beamline toggling
+against simulated BPMs at several device counts, with the display configured like
+the example application, including the history waterfalls and diagnostics. Reports the median and p99 time
+and the memory allocated per call of each phase, and the bytes of the document
+patches an update sends. Results can be stored as JSON and compared against a
+stored baseline to catch regressions.
+
+Usage:
+    python benchmarks/display.py [--sizes 183 1000 10000] [--repeat N] [--save]
+        [--output results.json] [--baseline baseline.json] [--tolerance 1.25]
+
+``--save`` stores the results as ``benchmarks/results/<version>.json``.
+
+"""
+from typing import Callable, Dict, List
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+SIZES = (183, 1000, 10000)
+
+# directory of the results stored with --save, one file per package version
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# phases whose median time may grow by at most the tolerance factor over the baseline
+PHASES = ("construct", "poll", "update", "update_few", "reference", "toggle")
+
+# shots kept in the waterfalls, five minutes at the target period of the example
+HISTORY_N = 600
+
+# devices whose readings change per update of the update_few phase
+FEW_CHANGED = 5
+
+
+def build_display(n_devices: int, seed: int = 0, history_n: int = HISTORY_N, diagnostics: bool = True):
+    """Build an OrbitDisplay configured like the example application, with a
+    polling acquisition of simulated BPMs per beamline.
+
+    """
+    from lcls_orbit.simulation import simulated_display
+
+    return simulated_display(
+        n_devices, seed, dropout=0.01, reference_n=100, history_n=history_n, diagnostics=diagnostics
+    )
+
+
+class PatchCounter:
+    """Serializes the change events of a document like a server session would and
+    counts the bytes sent.
+
+    """
+
+    def __init__(self, doc):
+        from bokeh.protocol import Protocol
+
+        self._protocol = Protocol()
+        self._events = []
+        self.bytes = 0
+        doc.on_change(self._events.append)
+
+    def flush(self) -> None:
+        if not self._events:
+            return
+
+        message = self._protocol.create("PATCH-DOC", self._events)
+        self.bytes += len(message.header_json) + len(message.metadata_json) + len(message.content_json)
+        self.bytes += sum(len(buffer[1]) if isinstance(buffer, tuple) else len(buffer.data) for buffer in message.buffers)
+        self._events.clear()
+
+
+def measure(call: Callable[[], None], repeat: int) -> Dict[str, float]:
+    """Time repeat calls, then repeat the calls while tracing allocations.
+
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    allocated = []
+    for _ in range(repeat):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        call()
+        allocated.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    return {
+        "median_ms": float(np.median(times)) * 1000,
+        "p99_ms": float(np.percentile(times, 99)) * 1000,
+        "peak_alloc_kb": float(np.median(allocated)) / 1024,
+    }
+
+
+def run_size(n_devices: int, repeat: int) -> Dict[str, dict]:
+    from lcls_orbit.collector import ReferenceCollector
+
+    results = {}
+
+    results["construct"] = measure(lambda: build_display(n_devices), max(repeat // 10, 3))
+
+    display, doc = build_display(n_devices)
+    patches = PatchCounter(doc)
+    acquisition = display.acquisition
+
+    # warm up, the first update sends the full data
+    display.update()
+    patches.flush()
+    patches.bytes = 0
+
+    simulator = acquisition.controller.simulator
+
+    # every poll reads new values
+    def poll():
+        simulator.step()
+        return acquisition.poll()
+
+    results["poll"] = measure(poll, repeat)
+
+    # snapshots are polled up front so update is timed on its own
+    snapshots = iter([poll() for _ in range(2 * repeat)])
+
+    def update():
+        display.update(next(snapshots))
+        patches.flush()
+
+    results["update"] = measure(update, repeat)
+    results["update"]["patch_kb"] = patches.bytes / 1024 / (2 * repeat)
+
+    # monitor style snapshots where only a few devices changed, which patches
+    # the changed rows instead of replacing the columns
+    rng = np.random.default_rng(0)
+    orbit = np.array(acquisition.latest.orbit)
+    few = []
+    for _ in range(2 * repeat):
+        changed = np.zeros(orbit.shape, dtype=bool)
+        changed[:, rng.choice(n_devices, min(FEW_CHANGED, n_devices), replace=False)] = True
+        orbit = orbit.copy()
+        orbit[changed] += rng.normal(0, 0.01, np.count_nonzero(changed))
+        orbit.setflags(write=False)
+        changed.setflags(write=False)
+        few.append(acquisition._publish(orbit, acquisition.latest.shading, changed=changed))
+
+    snapshots = iter(few)
+    patches.bytes = 0
+    results["update_few"] = measure(update, repeat)
+    results["update_few"]["patch_kb"] = patches.bytes / 1024 / (2 * repeat)
+
+    # references are collected from the published snapshots, independent of update
+    def reference():
+        collector = ReferenceCollector(acquisition, display._reference_n, rate=None)
+        collector.start()
+
+        # dropped readings are not sampled, so a few more shots may be needed
+        while not collector.done:
+            poll()
+
+        display._swap_reference(collector.reference(fallback=display._state.active_reference))
+
+    results["reference"] = measure(reference, max(repeat // 20, 3))
+
+    beamlines = iter(["sxr", "hxr"] * repeat)
+
+    def toggle():
+        display.toggle_beamline(next(beamlines))
+        patches.flush()
+
+    results["toggle"] = measure(toggle, max(repeat // 5, 4))
+
+    return results
+
+
+def run(sizes: List[int], repeat: int) -> dict:
+    import bokeh
+    import lcls_orbit
+
+    results = {
+        "metadata": {
+            "version": lcls_orbit.__version__,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "bokeh": bokeh.__version__,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "sizes": {},
+    }
+
+    for n_devices in sizes:
+        results["sizes"][str(n_devices)] = run_size(n_devices, repeat)
+
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Phases whose median time exceeds the baseline by more than the tolerance.
+
+    """
+    regressions = []
+
+    for size, phases in results["sizes"].items():
+        for phase in PHASES:
+            reference = baseline.get("sizes", {}).get(size, {}).get(phase)
+            if reference is None:
+                continue
+
+            if phases[phase]["median_ms"] > reference["median_ms"] * tolerance:
+                regressions.append(
+                    f"{phase} at {size} devices: {phases[phase]['median_ms']:.2f} ms "
+                    f"(baseline {reference['median_ms']:.2f} ms)"
+                )
+
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="device counts")
+    parser.add_argument("--repeat", type=int, default=100, help="calls per phase")
+    parser.add_argument("--save", action="store_true", help="store results in the results directory")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results stored in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="allowed slowdown over the baseline")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat)
+
+    for size, phases in results["sizes"].items():
+        print(f"{size} devices")
+        for phase in PHASES:
+            result = phases[phase]
+            line = (
+                f"    {phase:<10} {result['median_ms']:9.2f} ms  p99 {result['p99_ms']:9.2f} ms"
+                f"  alloc {result['peak_alloc_kb']:9.1f} kB"
+            )
+            if "patch_kb" in result:
+                line += f"  patch {result['patch_kb']:7.1f} kB"
+            print(line)
+
+    outputs = [args.output] if args.output else []
+    if args.save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        outputs.append(os.path.join(RESULTS_DIR, f"{results['metadata']['version']}.json"))
+
+    for output in outputs:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
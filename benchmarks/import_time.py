@@ -0,0 +1,83 @@
+"""Import time benchmark for the lcls_orbit package.
+
+Imports lightweight entry points of the package in fresh interpreters and fails if
+they load GUI or EPICS dependencies or exceed their time budget.
+
+Usage:
+    python benchmarks/import_time.py [--repeat N]
+
+"""
+from typing import Dict, List, Tuple
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# module: (budget in ms, modules that must not be imported)
+CASES = {
+    "lcls_orbit": (50.0, ("numpy", "pandas", "bokeh", "tornado", "lume_model", "lume_epics")),
+    "lcls_orbit.lattice": (250.0, ("pandas", "bokeh", "tornado", "lume_model", "lume_epics")),
+    "lcls_orbit.acquisition": (250.0, ("pandas", "bokeh", "tornado", "lume_model", "lume_epics")),
+}
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def measure(module: str) -> Tuple[float, List[str]]:
+    """Import a module in a fresh interpreter and return the import time in ms and
+    the names of all loaded modules.
+
+    """
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module)], check=True, capture_output=True, text=True
+    ).stdout
+    result = json.loads(output)
+    return result["elapsed"] * 1000, result["modules"]
+
+
+def run(repeat: int = 5) -> Dict[str, dict]:
+    results = {}
+
+    for module, (budget, forbidden) in CASES.items():
+        times = []
+        for _ in range(repeat):
+            elapsed, modules = measure(module)
+            times.append(elapsed)
+
+        loaded = sorted({name.split(".")[0] for name in modules} & set(forbidden))
+        median = statistics.median(times)
+        results[module] = {
+            "median_ms": median,
+            "budget_ms": budget,
+            "forbidden_loaded": loaded,
+            "ok": median <= budget and not loaded,
+        }
+
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="imports per module")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+
+    for module, result in results.items():
+        status = "ok" if result["ok"] else "FAIL"
+        print(f"{module:<28} {result['median_ms']:8.1f} ms (budget {result['budget_ms']:.0f} ms) {status}")
+        if result["forbidden_loaded"]:
+            print(f"    loaded: {', '.join(result['forbidden_loaded'])}")
+
+    return 0 if all(result["ok"] for result in results.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
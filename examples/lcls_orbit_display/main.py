@@ -1,73 +1,108 @@
-import pandas as pd
-import numpy as np
-from matplotlib import cm
-from matplotlib.colors import ListedColormap
+import atexit
+import os
+import time
+
 from bokeh.io import curdoc
 from bokeh.layouts import column, row
 
-from bokeh.models import CustomJS, Dropdown, Div, ColorBar, LinearColorMapper
-from bokeh.themes import built_in_themes
 from lume_epics.client.controller import Controller
-from lume_model.variables import ScalarOutputVariable, TableVariable
+from lume_model.variables import ScalarOutputVariable
 
 
-from lcls_orbit import SXR_COLORS, HXR_COLORS
+from lcls_orbit import HXR_COLORS
+from lcls_orbit.acquisition import MonitorAcquisition, OrbitAcquisition, shared_acquisition
+from lcls_orbit.lattice import load_bpms
+from lcls_orbit.recorder import OrbitRecorder
+from lcls_orbit.references import shared_reference_store
+from lcls_orbit.replay import ReplayAcquisition
+from lcls_orbit.simulation import BPMSimulator, SimulatedController
+from lcls_orbit.scheduler import RenderScheduler
 from lcls_orbit.widgets import OrbitDisplay
 
-hxr_df= pd.read_csv("./examples/files/cu_hxr_basic.csv")
-hxr_BPMS_df = hxr_df[hxr_df["device_name"].apply(lambda x: isinstance(x, str) and "BPMS" in x)]
+# parsed once per process and shared by all sessions
+hxr_lattice = load_bpms("./examples/files/cu_hxr_basic.csv")
+sxr_lattice = load_bpms("./examples/files/cu_sxr_basic.csv")
+
+# set up table var
+hxr_table_var = hxr_lattice.table
+sxr_table_var = sxr_lattice.table
 
-sxr_df= pd.read_csv("./examples/files/cu_sxr_basic.csv")
-sxr_BPMS_df = sxr_df[sxr_df["device_name"].apply(lambda x: isinstance(x, str) and "BPMS" in x)]
+hxr_shading_var = ScalarOutputVariable(name='GDET:FEE1:241:ENRC')
+sxr_shading_var = ScalarOutputVariable(name='EM1K0:GMD:HPS:milliJoulesPerPulse')
 
+hxr_variables = dict(hxr_lattice.variables)
+sxr_variables = dict(sxr_lattice.variables)
 
-positions = {}
+hxr_variables['GDET:FEE1:241:ENRC'] = hxr_shading_var
+sxr_variables['EM1K0:GMD:HPS:milliJoulesPerPulse'] = sxr_shading_var
 
-variables = {}
-hxr_table = {"X": {}, "Y": {}, "Z": {}}
-hxr_rows = []
 
+# "poll" reads all PVs every period, "monitor" subscribes to CA monitors and only
+# publishes changes, "simulate" polls simulated BPMs in process, "replay" plays
+# the recordings named by LCLS_ORBIT_REPLAY_HXR and LCLS_ORBIT_REPLAY_SXR at
+# LCLS_ORBIT_REPLAY_SPEED times real time
+ACQUISITION_MODE = os.environ.get("LCLS_ORBIT_ACQUISITION", "poll")
 
-for index, table_row in hxr_BPMS_df.iterrows():
-    hxr_rows.append(table_row['device_name'])
-    output_x = ScalarOutputVariable(name=f"{table_row['device_name']}:X")
-    output_y = ScalarOutputVariable(name=f"{table_row['device_name']}:Y")
-    hxr_table["X"][table_row['device_name']] = output_x
-    hxr_table["Y"][table_row['device_name']] = output_y
-    hxr_table["Z"][table_row['device_name']]=table_row["z_position"]
-    variables[f"{table_row['device_name']}:X"]= output_x
-    variables[f"{table_row['device_name']}:Y"]=output_y
+# number of shots shown in the waterfall plots, off unless set, e.g. 600 keeps five
+# minutes at the target period
+HISTORY_N = int(os.environ["LCLS_ORBIT_HISTORY"]) if os.environ.get("LCLS_ORBIT_HISTORY") else None
 
-sxr_table = {"X": {}, "Y": {}, "Z": {}}
-sxr_rows = []
+# if set, a table of update timings is shown below the plots
+DIAGNOSTICS = bool(os.environ.get("LCLS_ORBIT_DIAGNOSTICS"))
 
-for index, table_row in sxr_BPMS_df.iterrows():
-    sxr_rows.append(table_row['device_name'])
-    output_x = ScalarOutputVariable(name=f"{table_row['device_name']}:X")
-    output_y = ScalarOutputVariable(name=f"{table_row['device_name']}:Y")
-    sxr_table["X"][table_row['device_name']] = output_x
-    sxr_table["Y"][table_row['device_name']] = output_y
-    sxr_table["Z"][table_row['device_name']] = table_row["z_position"]
-    variables[f"{table_row['device_name']}:X"] = output_x
-    variables[f"{table_row['device_name']}:Y"] = output_y
+# if set, every acquired orbit is recorded to a file in this directory
+RECORD_DIR = os.environ.get("LCLS_ORBIT_RECORD_DIR")
 
-# set up table var
-hxr_table_var = TableVariable(table_rows=hxr_rows, table_data=hxr_table)
-sxr_table_var = TableVariable(table_rows=sxr_rows, table_data=sxr_table)
+# recordings are chunk directories unless set to "h5", which requires h5py
+RECORD_FORMAT = os.environ.get("LCLS_ORBIT_RECORD_FORMAT", "")
 
-hxr_shading_var = ScalarOutputVariable(name='GDET:FEE1:241:ENRC')
-sxr_shading_var = ScalarOutputVariable(name='EM1K0:GMD:HPS:milliJoulesPerPulse')
 
-variables['GDET:FEE1:241:ENRC'] = hxr_shading_var
-variables['EM1K0:GMD:HPS:milliJoulesPerPulse'] = sxr_shading_var
+def build_acquisition(beamline, table_var, shading_var, variables):
+    if ACQUISITION_MODE == "replay":
+        speed = float(os.environ.get("LCLS_ORBIT_REPLAY_SPEED", "1"))
+        recording = os.environ[f"LCLS_ORBIT_REPLAY_{beamline.upper()}"]
+        return ReplayAcquisition(recording, shading_var, speed=speed, loop=True, period=0.5, threaded=True)
+
+    if ACQUISITION_MODE == "simulate":
+        controller = SimulatedController(BPMSimulator(table_var.rows, shading_pvs=[shading_var.name], dropout=0.01))
+        acquisition = OrbitAcquisition(table_var, controller, shading_var, period=0.5, threaded=True)
+
+    elif ACQUISITION_MODE == "monitor":
+        acquisition = MonitorAcquisition(table_var, shading_var, protocol="ca", period=0.5, threaded=True)
+
+    else:
+        # set up controller
+        controller = Controller("ca", variables, {}, prefix=None, auto_monitor=False, monitor_poll_timeout=0.01)
+        acquisition = OrbitAcquisition(table_var, controller, shading_var, period=0.5, threaded=True)
+
+    if RECORD_DIR is not None:
+        os.makedirs(RECORD_DIR, exist_ok=True)
+        filename = f"{beamline}_{time.strftime('%Y%m%d_%H%M%S')}"
+        if RECORD_FORMAT == "h5":
+            filename += ".h5"
+
+        recorder = OrbitRecorder.for_acquisition(os.path.join(RECORD_DIR, filename), acquisition)
+
+        # writes the last buffered chunk and closes the file on shutdown
+        atexit.register(recorder.close)
+
+    return acquisition
+
 
-# set up controller
-controller = Controller("ca", variables, {}, prefix=None, auto_monitor=False, monitor_poll_timeout=0.01)
+# one controller and poll loop per beamline, shared by all sessions of this process
+acquisitions = {
+    "hxr": shared_acquisition("hxr", lambda: build_acquisition("hxr", hxr_table_var, hxr_shading_var, hxr_variables)),
+    "sxr": shared_acquisition("sxr", lambda: build_acquisition("sxr", sxr_table_var, sxr_shading_var, sxr_variables)),
+}
 
 
 # create longitudinal plot
 long_plot = OrbitDisplay(
-    hxr_table_var, sxr_table_var, hxr_shading_var, sxr_shading_var, controller, width=1024, color_var= hxr_shading_var, color_map=HXR_COLORS, extents=[0,5], bar_width=5, reference_n=100
+    hxr_table_var, sxr_table_var, hxr_shading_var, sxr_shading_var, width=1024, color_var= hxr_shading_var, color_map=HXR_COLORS, extents=[0,5], bar_width=5, reference_n=100, acquisitions=acquisitions,
+    history_n=HISTORY_N,
+    diagnostics=DIAGNOSTICS,
+    # references are saved to a database shared by all sessions and processes
+    reference_store=shared_reference_store(),
 )
 
 
@@ -77,10 +112,14 @@ curdoc().title = "LCLS Orbit Display"
 curdoc().add_root(
     column(
         row(column(long_plot.beamline_selection_dropdown), long_plot.label),
-        row(column(long_plot.compare_reference_dropdown), column(long_plot.reference_button),column(long_plot.save_reference_button), column(long_plot.reset_reference_button)),
+        row(column(long_plot.compare_reference_dropdown), column(long_plot.reference_button),column(long_plot.save_reference_button), column(long_plot.reset_reference_button), column(long_plot.reference_tag_input), column(long_plot.rms_toggle)),
         long_plot.x_plot, 
         long_plot.y_plot,
+        *([long_plot.x_waterfall, long_plot.y_waterfall] if HISTORY_N else []),
+        *([long_plot.diagnostics] if DIAGNOSTICS else []),
     )
 )
 
-curdoc().add_periodic_callback(long_plot.update, 500)
+# snapshots are polled in a background thread, the scheduler redraws the latest
+# one at an adaptive rate
+RenderScheduler(long_plot, curdoc(), target_period=0.5).start()
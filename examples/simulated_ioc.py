@@ -0,0 +1,44 @@
+"""Soft IOC serving simulated BPM and shading PVs of both beamlines, so the orbit
+display can be run without access to the LCLS network. Requires pcaspy.
+
+Usage:
+    python examples/simulated_ioc.py [--noise MM] [--drift MM] [--dropout P] [--rate HZ]
+
+"""
+import argparse
+import logging
+
+from lcls_orbit.lattice import load_bpms
+from lcls_orbit.simulation import BPMSimulator, SHADING_PVS, serve_soft_ioc
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--noise", type=float, default=0.02, help="reading noise in mm")
+    parser.add_argument("--drift", type=float, default=0.002, help="drift step per update in mm")
+    parser.add_argument("--dropout", type=float, default=0.0, help="probability of a missing reading")
+    parser.add_argument("--rate", type=float, default=10.0, help="updates per second")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    # BPMs shared by both beamlines are served once
+    devices = dict.fromkeys(
+        load_bpms("./examples/files/cu_hxr_basic.csv").devices + load_bpms("./examples/files/cu_sxr_basic.csv").devices
+    )
+
+    simulator = BPMSimulator(
+        list(devices),
+        shading_pvs=SHADING_PVS,
+        noise=args.noise,
+        drift=args.drift,
+        dropout=args.dropout,
+        update_rate=args.rate,
+        seed=args.seed,
+    )
+    serve_soft_ioc(simulator)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,41 @@
-import numpy as np
-from . import _version
-__version__ = _version.get_versions()['version']
+import importlib
 
+# heavy dependencies (numpy, bokeh, lume-epics, ...) are only imported by the
+# submodules, which are loaded on first attribute access
+_LAZY_ATTRIBUTES = {
+    "OrbitDisplay": "widgets",
+    "PlotAnnotations": "widgets",
+    "BeamlineState": "widgets",
+    "OrbitAcquisition": "acquisition",
+    "OrbitSnapshot": "acquisition",
+    "MonitorAcquisition": "acquisition",
+    "shared_acquisition": "acquisition",
+    "RenderScheduler": "scheduler",
+    "UpdateMetrics": "metrics",
+    "Reference": "references",
+    "ReferenceStore": "references",
+    "shared_reference_store": "references",
+    "ReferenceCollector": "collector",
+    "ColorScale": "colors",
+    "BPMLattice": "lattice",
+    "load_bpms": "lattice",
+    "load_lattice": "lattice",
+    "OrbitHistory": "history",
+    "OrbitRecorder": "recorder",
+    "OrbitRecording": "replay",
+    "ReplayAcquisition": "replay",
+    "BPMSimulator": "simulation",
+    "SimulatedController": "simulation",
+    "RunningStatistics": "statistics",
+    "WindowedStatistics": "statistics",
+    "ExponentialStatistics": "statistics",
+}
 
 
 HXR_COLORS = ("#000000", "#02004a", "#030069", "#04008f", "#0500b3", "#0700ff")
 SXR_COLORS = ("#000000", "#330000", "#520000", "#850000", "#ad0000", "#ff0000")
 
-HXR_AREAS = {
+HXR_AREA_EXTENTS = {
     "GUN" : [2017.911, 2018.712],
     "L0" : [2018.712, 2024.791],
     "DL1_1": [2024.791, 2031.992],
@@ -28,9 +56,9 @@ HXR_AREAS = {
     "DMPH_2": [3734.407, 3765.481]
 }
 
-HXR_AREAS = {np.mean(value): key for key, value in HXR_AREAS.items()}
+HXR_AREAS = {(start + end) / 2: key for key, (start, end) in HXR_AREA_EXTENTS.items()}
 
-SXR_AREAS = {
+SXR_AREA_EXTENTS = {
     "GUN" : [2017.911, 2017.911],
     "L0" : [2018.712, 2024.791],
     "DL1_1": [2024.791, 2031.992],
@@ -50,4 +78,25 @@ SXR_AREAS = {
     "DMPS_2": [3734.407, 3765.481]
 }
 
-SXR_AREAS = {np.mean(value): key for key, value in SXR_AREAS.items()}
\ No newline at end of file
+SXR_AREAS = {(start + end) / 2: key for key, (start, end) in SXR_AREA_EXTENTS.items()}
+
+
+def __getattr__(name):
+    if name == "__version__":
+        from . import _version
+
+        version = _version.get_versions()["version"]
+        globals()["__version__"] = version
+        return version
+
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(f".{_LAZY_ATTRIBUTES[name]}", __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_ATTRIBUTES) + ["__version__"])
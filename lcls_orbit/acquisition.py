@@ -0,0 +1,607 @@
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Tuple
+import logging
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from lcls_orbit.statistics import ExponentialStatistics
+
+if TYPE_CHECKING:
+    from lume_model.variables import TableVariable, ScalarVariable
+    from lume_epics.client.controller import Controller
+
+logger = logging.getLogger(__name__)
+
+# plane order used for the rows of the orbit arrays
+PLANES = ("X", "Y")
+
+
+def join_ca_context() -> None:
+    """Join the Channel Access context of the controllers from a new thread, which
+    CA requires. Does nothing unless pyepics is in use.
+
+    """
+    if "epics" in sys.modules:
+        from epics import ca
+
+        ca.use_initial_context()
+
+
+@dataclass(frozen=True)
+class OrbitSnapshot:
+    """Immutable orbit reading shared between displays.
+
+    Attributes:
+        devices (Tuple[str]): Device names, one per column of orbit.
+        z (np.ndarray): Read-only z positions of the devices.
+        orbit (np.ndarray): Read-only (len(PLANES), n_devices) float64 array, NaN where
+            a reading was missing.
+        shading (float): Value of the shading PV, NaN if unavailable.
+        timestamp (float): Acquisition time in seconds since the epoch.
+        sequence (int): Acquisition counter of the source, increasing by one per poll.
+        changed (Optional[np.ndarray]): Read-only boolean mask of the orbit entries
+            that changed since the snapshot with the previous sequence number, None
+            if unknown.
+        jitter (Optional[np.ndarray]): Read-only exponentially weighted RMS of the
+            orbit with the shape of orbit, None if the source tracks no jitter.
+
+    """
+
+    devices: Tuple[str, ...]
+    z: np.ndarray
+    orbit: np.ndarray
+    shading: float
+    timestamp: float
+    sequence: int
+    changed: Optional[np.ndarray] = None
+    jitter: Optional[np.ndarray] = None
+
+
+class OrbitAcquisition:
+    """Acquisition of the orbit of one beamline. Polls the BPM table and shading PV
+    and publishes the result as an immutable OrbitSnapshot, so a single instance
+    can back any number of OrbitDisplays.
+
+    """
+
+    def __init__(
+        self,
+        table: "TableVariable",
+        controller: "Controller",
+        shading_var: "ScalarVariable" = None,
+        period: float = 0.5,
+        threaded: bool = False,
+        jitter_alpha: Optional[float] = 0.05,
+    ):
+        """
+        Args:
+            table (TableVariable): Table of BPM variables with X, Y and Z columns.
+            controller (Controller): Controller used for accessing the PVs.
+            shading_var (ScalarVariable): Optional shading PV variable.
+            period (float): Poll period in seconds used by start.
+            threaded (bool): Whether start polls in a background thread instead of
+                on the current IO loop.
+            jitter_alpha (Optional[float]): Weight of the newest snapshot in the
+                orbit jitter statistics, None disables them.
+
+        """
+        from lume_epics.client.monitors import PVTable
+
+        self._setup(table, period, threaded, jitter_alpha)
+
+        self._controller = controller
+        self._monitor = PVTable(table, controller)
+
+        self._shading_monitor = None
+        self.set_shading_var(shading_var)
+
+    def _setup(self, table: "TableVariable", period: float, threaded: bool, jitter_alpha: Optional[float]) -> None:
+        """Initialize the state shared by all acquisition modes.
+
+        """
+        self._table = table
+        self._controller = None
+        self._shading_var = None
+
+        self._devices = tuple(table.rows)
+        self._z = np.array([table.table_data["Z"][device] for device in self._devices], dtype=np.float64)
+        self._z.setflags(write=False)
+
+        self.period = period
+        self.threaded = threaded
+
+        self._snapshot = None
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._subscribers = []
+        self._callback = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+        # per device and plane statistics of the published orbits
+        self._jitter = None
+        if jitter_alpha is not None:
+            self._jitter = ExponentialStatistics((len(PLANES), len(self._devices)), alpha=jitter_alpha)
+
+    @property
+    def table(self) -> "TableVariable":
+        return self._table
+
+    @property
+    def controller(self) -> "Controller":
+        return self._controller
+
+    @property
+    def shading_var(self) -> Optional["ScalarVariable"]:
+        return self._shading_var
+
+    @property
+    def devices(self) -> Tuple[str, ...]:
+        return self._devices
+
+    @property
+    def z(self) -> np.ndarray:
+        return self._z
+
+    @property
+    def latest(self) -> Optional[OrbitSnapshot]:
+        """Most recent snapshot, None before the first poll.
+
+        """
+        return self._snapshot
+
+    @property
+    def jitter(self) -> Optional[ExponentialStatistics]:
+        """Statistics of the published orbits, None if disabled. Updated while
+        holding the acquisition lock.
+
+        """
+        return self._jitter
+
+    @property
+    def running(self) -> bool:
+        return self._callback is not None or self._thread is not None
+
+    @property
+    def _jitter_alpha(self) -> Optional[float]:
+        return None if self._jitter is None else self._jitter.alpha
+
+    def with_table(self, table: "TableVariable") -> "OrbitAcquisition":
+        """Acquisition of the same kind and configuration reading the BPMs of
+        another table. The new acquisition is not started.
+
+        """
+        return OrbitAcquisition(
+            table, self._controller, self._shading_var, self.period, self.threaded, self._jitter_alpha
+        )
+
+    def subscribe(self, callback: Callable[[OrbitSnapshot], None]) -> None:
+        """Register a callback receiving every published snapshot. Callbacks run in
+        the thread that polled, so they should only hand the snapshot over.
+
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[OrbitSnapshot], None]) -> None:
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def set_shading_var(self, shading_var: Optional["ScalarVariable"]) -> None:
+        """Assign the shading PV variable. Keeps the current monitor if the variable
+        names the same PV.
+
+        """
+        if shading_var is None:
+            self._shading_var = None
+            self._shading_monitor = None
+
+        elif self._shading_var is None or self._shading_var.name != shading_var.name:
+            from lume_epics.client.monitors import PVScalar
+
+            self._shading_var = shading_var
+            self._shading_monitor = PVScalar(shading_var, self._controller)
+
+    def read(self) -> Tuple[np.ndarray, float]:
+        """Read the current orbit and shading value without publishing them, e.g. for
+        sampling the orbit faster than the poll period. Reads of concurrent threads
+        are serialized.
+
+        Returns:
+            The read-only (len(PLANES), n_devices) orbit, NaN where a reading was
+            missing, and the shading value, NaN if unavailable.
+
+        """
+        with self._read_lock:
+            return self._read(self._monitor, self._shading_monitor)
+
+    def reader(self) -> Callable[[], Tuple[np.ndarray, float]]:
+        """Function reading like read through PV monitors of its own, so frequent
+        private reads, e.g. of a reference collection, do not hold up the poll loop
+        shared with other sessions. Calls of the function must not overlap.
+
+        """
+        from lume_epics.client.monitors import PVScalar, PVTable
+
+        monitor = PVTable(self._table, self._controller)
+        shading_monitor = None if self._shading_var is None else PVScalar(self._shading_var, self._controller)
+
+        return lambda: self._read(monitor, shading_monitor)
+
+    def _read(self, monitor, shading_monitor) -> Tuple[np.ndarray, float]:
+        vals = monitor.poll()
+        shading = None if shading_monitor is None else shading_monitor.poll()
+
+        orbit = np.empty((len(PLANES), len(self._devices)), dtype=np.float64)
+        for i, plane in enumerate(PLANES):
+            orbit[i] = list(map(vals[plane].get, self._devices))
+
+        orbit.setflags(write=False)
+
+        return orbit, np.nan if shading is None else float(shading)
+
+    def poll(self) -> OrbitSnapshot:
+        """Poll all PVs and publish a new snapshot.
+
+        """
+        return self._publish(*self.read())
+
+    def _publish(
+        self, orbit: np.ndarray, shading: float, timestamp: float = None, changed: np.ndarray = None
+    ) -> OrbitSnapshot:
+        """Store a read-only orbit array as the latest snapshot and notify the
+        subscribers.
+
+        """
+        with self._lock:
+            jitter = None
+            if self._jitter is not None:
+                # entries that did not change are not new samples, NaN is ignored
+                self._jitter.update(orbit if changed is None else np.where(changed, orbit, np.nan))
+                jitter = self._jitter.std
+                jitter.setflags(write=False)
+
+            self._sequence += 1
+            snapshot = OrbitSnapshot(
+                devices=self._devices,
+                z=self._z,
+                orbit=orbit,
+                shading=shading,
+                timestamp=time.time() if timestamp is None else timestamp,
+                sequence=self._sequence,
+                changed=changed,
+                jitter=jitter,
+            )
+            self._snapshot = snapshot
+            subscribers = list(self._subscribers)
+
+        for callback in subscribers:
+            try:
+                callback(snapshot)
+
+            except Exception:
+                logger.exception("Orbit subscriber failed.")
+
+        return snapshot
+
+    def snapshot(self) -> OrbitSnapshot:
+        """Return the latest snapshot. Polls directly if no poll loop is running.
+
+        """
+        if not self.running or self._snapshot is None:
+            return self.poll()
+
+        return self._snapshot
+
+    def start(self) -> None:
+        """Start polling every period seconds, either in a background thread or on
+        the current IO loop.
+
+        """
+        if self.running:
+            return
+
+        if self.threaded:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="orbit-acquisition", daemon=True)
+            self._thread.start()
+
+        else:
+            from tornado.ioloop import PeriodicCallback
+
+            self._callback = PeriodicCallback(self._poll_callback, self.period * 1000)
+            self._callback.start()
+
+    def stop(self) -> None:
+        """Stop the poll loop.
+
+        """
+        if self._callback is not None:
+            self._callback.stop()
+            self._callback = None
+
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        join_ca_context()
+
+        while not self._stop_event.is_set():
+            start = time.monotonic()
+            self._poll_callback()
+            self._stop_event.wait(max(self.period - (time.monotonic() - start), 0))
+
+    def _poll_callback(self) -> None:
+        try:
+            self.poll()
+
+        except Exception:
+            logger.exception("Unable to poll orbit.")
+
+
+class MonitorAcquisition(OrbitAcquisition):
+    """Acquisition of the orbit of one beamline from CA or PVA monitor subscriptions.
+    Monitor callbacks write into a live orbit array and flag the updated entries,
+    poll only publishes a snapshot if anything changed since the previous one.
+
+    Requires pyepics for Channel Access and p4p for PV Access.
+
+    """
+
+    def __init__(
+        self,
+        table: "TableVariable",
+        shading_var: "ScalarVariable" = None,
+        protocol: str = "ca",
+        period: float = 0.5,
+        threaded: bool = False,
+        jitter_alpha: Optional[float] = 0.05,
+    ):
+        """
+        Args:
+            table (TableVariable): Table of BPM variables with X, Y and Z columns.
+            shading_var (ScalarVariable): Optional shading PV variable.
+            protocol (str): Protocol of the PVs, "ca" or "pva".
+            period (float): Publish period in seconds used by start.
+            threaded (bool): Whether start publishes from a background thread instead
+                of the current IO loop.
+            jitter_alpha (Optional[float]): Weight of the newest snapshot in the
+                orbit jitter statistics, None disables them.
+
+        """
+        if protocol not in ("ca", "pva"):
+            raise ValueError(f"Unsupported protocol {protocol}.")
+
+        self._setup(table, period, threaded, jitter_alpha)
+
+        self._protocol = protocol
+        self._context = None
+        self._subscriptions = {}
+        self._shading_subscription = None
+
+        n_devices = len(self._devices)
+        self._live = np.full((len(PLANES), n_devices), np.nan, dtype=np.float64)
+        self._changed = np.zeros((len(PLANES), n_devices), dtype=bool)
+        self._shading = np.nan
+        self._shading_changed = False
+        self._value_callbacks = []
+
+        for i, plane in enumerate(PLANES):
+            for j, device in enumerate(self._devices):
+                variable = table.table_data[plane][device]
+                self._subscriptions[(i, j)] = self._subscribe_pv(variable.name, (i, j))
+
+        self.set_shading_var(shading_var)
+
+    @property
+    def protocol(self) -> str:
+        return self._protocol
+
+    def with_table(self, table: "TableVariable") -> "MonitorAcquisition":
+        return MonitorAcquisition(
+            table, self._shading_var, self._protocol, self.period, self.threaded, self._jitter_alpha
+        )
+
+    def set_shading_var(self, shading_var: Optional["ScalarVariable"]) -> None:
+        """Assign the shading PV variable. Keeps the current subscription if the
+        variable names the same PV.
+
+        """
+        if shading_var is not None and self._shading_var is not None and self._shading_var.name == shading_var.name:
+            return
+
+        if self._shading_subscription is not None:
+            self._unsubscribe_pv(self._shading_subscription)
+            self._shading_subscription = None
+
+        self._shading_var = shading_var
+        self._set_value(None, None)
+
+        if shading_var is not None:
+            self._shading_subscription = self._subscribe_pv(shading_var.name, None)
+
+    def add_value_callback(self, callback: Callable[[Tuple[int, int], float], None]) -> None:
+        """Register a callback receiving every BPM monitor update as it arrives, with
+        the (plane, device) index of the reading and its value, NaN for missing
+        readings. Called from the monitor threads.
+
+        """
+        # the list is replaced instead of modified, so updates iterate it unlocked
+        with self._lock:
+            self._value_callbacks = self._value_callbacks + [callback]
+
+    def remove_value_callback(self, callback: Callable[[Tuple[int, int], float], None]) -> None:
+        with self._lock:
+            self._value_callbacks = [other for other in self._value_callbacks if other != callback]
+
+    def reader(self) -> Callable[[], Tuple[np.ndarray, float]]:
+        # copies of the monitored values are cheap
+        return self.read
+
+    def read(self) -> Tuple[np.ndarray, float]:
+        """Copy of the monitored orbit and shading value, without publishing them.
+
+        """
+        with self._lock:
+            orbit = self._live.copy()
+            shading = self._shading
+
+        orbit.setflags(write=False)
+
+        return orbit, shading
+
+    def poll(self) -> OrbitSnapshot:
+        """Publish the monitored values if any of them changed since the previous
+        snapshot, otherwise return the latest snapshot.
+
+        """
+        with self._lock:
+            if self._snapshot is not None and not self._shading_changed and not self._changed.any():
+                return self._snapshot
+
+            orbit = self._live.copy()
+            changed = self._changed.copy()
+            shading = self._shading
+            self._changed[:] = False
+            self._shading_changed = False
+
+        orbit.setflags(write=False)
+        changed.setflags(write=False)
+
+        return self._publish(orbit, shading, changed=changed)
+
+    def close(self) -> None:
+        """Stop publishing and clear all subscriptions.
+
+        """
+        self.stop()
+
+        for subscription in self._subscriptions.values():
+            self._unsubscribe_pv(subscription)
+
+        self._subscriptions = {}
+
+        if self._shading_subscription is not None:
+            self._unsubscribe_pv(self._shading_subscription)
+            self._shading_subscription = None
+
+        if self._context is not None:
+            self._context.close()
+            self._context = None
+
+    def _set_value(self, index: Optional[Tuple[int, int]], value) -> None:
+        """Store a monitor value, index None denotes the shading PV. Values that can
+        not be converted to float, including disconnects, are stored as NaN.
+
+        """
+        try:
+            value = float(value)
+
+        except (TypeError, ValueError):
+            value = np.nan
+
+        with self._lock:
+            if index is None:
+                self._shading = value
+                self._shading_changed = True
+
+            else:
+                self._live[index] = value
+                self._changed[index] = True
+
+            callbacks = self._value_callbacks if index is not None else ()
+
+        for callback in callbacks:
+            try:
+                callback(index, value)
+
+            except Exception:
+                logger.exception("Orbit value callback failed.")
+
+    def _subscribe_pv(self, pvname: str, index: Optional[Tuple[int, int]]):
+        if self._protocol == "ca":
+            import epics
+
+            def on_value(value=None, **kwargs):
+                self._set_value(index, value)
+
+            def on_connection(conn=True, **kwargs):
+                if not conn:
+                    self._set_value(index, None)
+
+            return epics.PV(
+                pvname, callback=on_value, connection_callback=on_connection, auto_monitor=True, form="native"
+            )
+
+        if self._context is None:
+            from p4p.client.thread import Context
+
+            self._context = Context("pva")
+
+        def on_update(value):
+            # p4p passes exceptions such as Disconnected to the callback
+            self._set_value(index, None if isinstance(value, Exception) else value)
+
+        return self._context.monitor(pvname, on_update, notify_disconnect=True)
+
+    def _unsubscribe_pv(self, subscription) -> None:
+        if self._protocol == "ca":
+            subscription.clear_callbacks()
+            subscription.disconnect()
+
+        else:
+            subscription.close()
+
+
+_shared_acquisitions: Dict[str, OrbitAcquisition] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_acquisition(key: str, factory: Callable[[], OrbitAcquisition]) -> OrbitAcquisition:
+    """Return the process wide acquisition registered under key. On first use the
+    acquisition is created with factory and its poll loop is started, later calls
+    return the same running instance.
+
+    Args:
+        key (str): Registry key, e.g. the beamline name.
+        factory (Callable[[], OrbitAcquisition]): Constructor of the acquisition.
+
+    """
+    with _shared_lock:
+        acquisition = _shared_acquisitions.get(key)
+
+        if acquisition is None:
+            acquisition = factory()
+            acquisition.start()
+            _shared_acquisitions[key] = acquisition
+
+    return acquisition
+
+
+def replace_acquisition(acquisition: OrbitAcquisition, table: "TableVariable") -> OrbitAcquisition:
+    """Return an acquisition of another table replacing acquisition, see
+    OrbitAcquisition.with_table. The replacement of a shared acquisition is
+    shared and started like it, so sessions switching to the same table share
+    one acquisition again. Otherwise the replacement is started if acquisition
+    is running.
+
+    """
+    with _shared_lock:
+        key = next((key for key, shared in _shared_acquisitions.items() if shared is acquisition), None)
+
+    if key is not None:
+        # tables are cached per process, so equal tables are the same object
+        return shared_acquisition(f"{key}:{id(table)}", lambda: acquisition.with_table(table))
+
+    replacement = acquisition.with_table(table)
+    if acquisition.running:
+        replacement.start()
+
+    return replacement
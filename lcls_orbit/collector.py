@@ -0,0 +1,236 @@
+from typing import Callable, Optional, Tuple
+import logging
+import threading
+import time
+
+import numpy as np
+
+from lcls_orbit.acquisition import PLANES, MonitorAcquisition, OrbitAcquisition, OrbitSnapshot, join_ca_context
+from lcls_orbit.references import Reference
+
+logger = logging.getLogger(__name__)
+
+# LCLS beam rate in Hz, the default rate polled acquisitions are sampled at
+BEAM_RATE = 120.0
+
+
+class ReferenceCollector:
+    """Collects the samples of a reference from an acquisition at the rate its
+    readings update, independent of any display. Monitor acquisitions deliver every
+    BPM update as it arrives, other acquisitions are sampled from their published
+    snapshots and read from a background thread at rate through PV monitors of
+    the collector's own, without publishing to the other subscribers of the
+    acquisition or holding up its poll loop. Only readings that changed since the
+    previous sample of a device count as new samples, so repeated reads of the
+    same shot are not sampled twice.
+
+    Samples go into a preallocated (len(PLANES), n_samples, n_devices) array. The
+    collection finishes once every device has n_samples samples, or once some have
+    and the others sent no new reading for stale_timeout seconds, so dead or frozen
+    BPMs do not hold it up. After timeout seconds it finishes with the samples
+    collected until then.
+
+    """
+
+    def __init__(
+        self,
+        acquisition: OrbitAcquisition,
+        n_samples: int,
+        rate: Optional[float] = BEAM_RATE,
+        timeout: float = 30.0,
+        stale_timeout: float = 2.0,
+    ):
+        """
+        Args:
+            acquisition (OrbitAcquisition): Acquisition of the sampled beamline.
+            n_samples (int): Number of samples per device.
+            rate (Optional[float]): Reads per second of acquisitions without
+                monitors, None only samples the snapshots they publish.
+            timeout (float): Seconds after which the collection finishes regardless
+                of the number of samples.
+            stale_timeout (float): Seconds without a new reading after which an
+                incomplete device no longer holds up a collection other devices
+                completed.
+
+        """
+        if n_samples < 1:
+            raise ValueError("Reference requires at least 1 sample.")
+
+        if rate is not None and rate <= 0:
+            raise ValueError("Sample rate must be positive.")
+
+        self.acquisition = acquisition
+        self.n_samples = n_samples
+        self.rate = rate
+        self.timeout = timeout
+        self.stale_timeout = stale_timeout
+        self.started = None
+
+        shape = (len(PLANES), len(acquisition.devices))
+        self._samples = np.full((len(PLANES), n_samples, shape[1]), np.nan, dtype=np.float64)
+        self._filled = np.zeros(shape, dtype=np.intp)
+        self._last = np.full(shape, np.nan, dtype=np.float64)
+
+        # monotonic time of the last new reading of every (plane, device) entry
+        self._updated = np.zeros(shape, dtype=np.float64)
+
+        # number of (plane, device) entries holding all their samples
+        self._complete = 0
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._done = threading.Event()
+        self._cancelled = False
+        self._thread = None
+        self._on_done = None
+
+    @property
+    def monitored(self) -> bool:
+        return isinstance(self.acquisition, MonitorAcquisition)
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    @property
+    def progress(self) -> int:
+        """Number of samples collected of the median device.
+
+        """
+        with self._lock:
+            return int(np.median(self._filled)) if self._filled.size else self.n_samples
+
+    def start(self, on_done: Callable[["ReferenceCollector"], None] = None) -> None:
+        """Start collecting. on_done is called from the collection thread once the
+        collection finished, unless it was cancelled.
+
+        """
+        if self._thread is not None:
+            return
+
+        self._on_done = on_done
+        self.started = time.time()
+        self._updated.fill(time.monotonic())
+
+        if self.monitored:
+            self.acquisition.add_value_callback(self._on_value)
+        else:
+            self.acquisition.subscribe(self._on_snapshot)
+
+        self._thread = threading.Thread(target=self._run, name="reference-collector", daemon=True)
+        self._thread.start()
+
+    def cancel(self) -> None:
+        self._cancelled = True
+        self._stop_event.set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Block until the collection finished, returns whether it did.
+
+        """
+        return self._done.wait(timeout)
+
+    def reference(self, fallback: Reference = None) -> Reference:
+        """Reference of the samples collected so far. Devices without samples take
+        the orbit of fallback, or 0.
+
+        """
+        with self._lock:
+            samples = self._samples.copy()
+
+        return Reference.from_samples(
+            self.acquisition.devices, samples, fallback=fallback, timestamp=self.started
+        )
+
+    def _run(self) -> None:
+        join_ca_context()
+
+        polled = not self.monitored and self.rate is not None
+        read = self.acquisition.reader() if polled else None
+        period = 1 / self.rate if polled else 0.1
+        deadline = time.monotonic() + self.timeout
+
+        while not self._stop_event.is_set() and time.monotonic() < deadline and not self._settled():
+            start = time.monotonic()
+
+            if polled:
+                try:
+                    self._sample(read()[0])
+
+                except Exception:
+                    logger.exception("Unable to read orbit for reference.")
+
+            self._stop_event.wait(max(period - (time.monotonic() - start), 0))
+
+        if self.monitored:
+            self.acquisition.remove_value_callback(self._on_value)
+        else:
+            self.acquisition.unsubscribe(self._on_snapshot)
+
+        self._done.set()
+
+        if self._on_done is not None and not self._cancelled:
+            try:
+                self._on_done(self)
+
+            except Exception:
+                logger.exception("Reference callback failed.")
+
+    def _settled(self) -> bool:
+        """Whether some entries completed and all others are stale.
+
+        """
+        with self._lock:
+            if not self._complete:
+                return False
+
+            incomplete = self._filled < self.n_samples
+            return not np.any(incomplete & (time.monotonic() - self._updated < self.stale_timeout))
+
+    def _on_snapshot(self, snapshot: OrbitSnapshot) -> None:
+        self._sample(snapshot.orbit)
+
+    def _sample(self, orbit: np.ndarray) -> None:
+        valid = np.isfinite(orbit)
+
+        with self._lock:
+            changed = valid & (orbit != self._last)
+            self._updated[changed] = time.monotonic()
+
+            new = changed & (self._filled < self.n_samples)
+            planes, devices = np.nonzero(new)
+            self._samples[planes, self._filled[new], devices] = orbit[new]
+            self._filled[new] += 1
+            self._complete += np.count_nonzero(self._filled[new] == self.n_samples)
+            np.copyto(self._last, orbit, where=valid)
+            complete = self._complete == self._filled.size
+
+        if complete:
+            self._stop_event.set()
+
+    def _on_value(self, index: Tuple[int, int], value: float) -> None:
+        # every monitor update is a new reading
+        if np.isnan(value):
+            return
+
+        with self._lock:
+            self._updated[index] = time.monotonic()
+
+            filled = self._filled[index]
+            if filled == self.n_samples:
+                return
+
+            self._samples[index[0], filled, index[1]] = value
+            self._filled[index] = filled + 1
+
+            if filled + 1 == self.n_samples:
+                self._complete += 1
+
+            complete = self._complete == self._filled.size
+
+        if complete:
+            self._stop_event.set()
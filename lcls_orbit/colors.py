@@ -0,0 +1,78 @@
+from typing import TYPE_CHECKING, Optional, Sequence
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from bokeh.models import LinearColorMapper
+
+# per device quantities bars can be colored by
+COLOR_SOURCES = ("shading", "jitter", "deviation")
+
+
+class ColorScale:
+    """Linear map of values onto the entries of a palette. Values are encoded as
+    palette indices in one vectorized step on the server, the browser looks the
+    colors up with the LinearColorMapper of mapper, so no color strings are built
+    or sent. Values outside the extents take the first or last color, NaN values
+    stay NaN and are drawn in the nan color of the mapper.
+
+    Since indices only change when a value crosses a palette boundary, index
+    columns also change far less often than the values they are computed from.
+
+    """
+
+    def __init__(self, palette: Sequence[str], low: float, high: float):
+        """
+        Args:
+            palette (Sequence[str]): Colors from low to high.
+            low (float): Value mapped to the first color.
+            high (float): Value mapped to the last color.
+
+        """
+        self.palette = tuple(palette)
+        self.low = low
+        self.high = high
+        self._prepare()
+
+    def update(self, palette: Sequence[str] = None, low: float = None, high: float = None) -> None:
+        if palette is not None:
+            self.palette = tuple(palette)
+
+        if low is not None:
+            self.low = low
+
+        if high is not None:
+            self.high = high
+
+        self._prepare()
+
+    def _prepare(self) -> None:
+        if not self.palette:
+            raise ValueError("Palette requires at least one color.")
+
+        if self.high <= self.low:
+            raise ValueError(f"Invalid color extents {self.low}, {self.high}.")
+
+        # palette entries per unit of value
+        self._scale = len(self.palette) / (self.high - self.low)
+
+    def encode(self, values: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Encode values as the palette index plus 0.5, NaN where the value is NaN.
+        Sending the center of each palette entry keeps the lookup of the browser
+        clear of rounding at the entry boundaries.
+
+        """
+        out = np.subtract(values, self.low, out=out, dtype=np.float64 if out is None else out.dtype)
+        out *= self._scale
+        np.floor(out, out=out)
+        np.clip(out, 0, len(self.palette) - 1, out=out)
+        out += 0.5
+        return out
+
+    def mapper(self, **kwargs) -> "LinearColorMapper":
+        """Client side mapper from the encoded values to colors.
+
+        """
+        from bokeh.models import LinearColorMapper
+
+        return LinearColorMapper(palette=list(self.palette), low=0, high=len(self.palette), **kwargs)
@@ -0,0 +1,89 @@
+import numpy as np
+
+from lcls_orbit.acquisition import PLANES
+
+
+class OrbitHistory:
+    """Fixed capacity ring buffer of the last orbits of one beamline. Memory is
+    allocated once, so the cost per session is predictable:
+    ``len(PLANES) * capacity * n_devices`` values of dtype plus one timestamp per
+    shot.
+
+    """
+
+    def __init__(self, n_devices: int, capacity: int, dtype: type = np.float32):
+        """
+        Args:
+            n_devices (int): Number of devices of each orbit.
+            capacity (int): Number of shots kept.
+            dtype (type): dtype of the stored orbits.
+
+        """
+        if capacity < 1:
+            raise ValueError("History capacity must be at least 1.")
+
+        self.capacity = capacity
+        self.n_devices = n_devices
+
+        # row i of the ring holds shot i modulo capacity, NaN until written
+        self._orbits = np.full((len(PLANES), capacity, n_devices), np.nan, dtype=dtype)
+        self._timestamps = np.full(capacity, np.nan, dtype=np.float64)
+        self._index = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        return self._orbits.nbytes + self._timestamps.nbytes
+
+    def append(self, orbit: np.ndarray, timestamp: float) -> None:
+        """Store a (len(PLANES), n_devices) orbit, overwriting the oldest shot once the
+        buffer is full.
+
+        """
+        self._orbits[:, self._index] = orbit
+        self._timestamps[self._index] = timestamp
+        self._index = (self._index + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def clear(self) -> None:
+        self._orbits.fill(np.nan)
+        self._timestamps.fill(np.nan)
+        self._index = 0
+        self._count = 0
+
+    @property
+    def newest(self) -> int:
+        """Ring row holding the newest shot.
+
+        """
+        return (self._index - 1) % self.capacity
+
+    def ring(self) -> np.ndarray:
+        """Copy of the buffer in ring order, shape (len(PLANES), capacity, n_devices).
+        Row newest holds the newest shot, the shots before it precede it cyclically.
+
+        """
+        return self._orbits.copy()
+
+    def ring_row(self, index: int) -> np.ndarray:
+        """Copy of a ring row of every plane, shape (len(PLANES), n_devices).
+
+        """
+        return self._orbits[:, index].copy()
+
+    def orbits(self) -> np.ndarray:
+        """Copy of the buffer in chronological order, shape
+        (len(PLANES), capacity, n_devices). The newest shot is last, rows not yet
+        written are NaN.
+
+        """
+        return np.concatenate((self._orbits[:, self._index:], self._orbits[:, :self._index]), axis=1)
+
+    def timestamps(self) -> np.ndarray:
+        """Timestamps matching the rows of orbits, NaN for rows not yet written.
+
+        """
+        return np.concatenate((self._timestamps[self._index:], self._timestamps[:self._index]))
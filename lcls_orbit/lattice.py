@@ -0,0 +1,212 @@
+from typing import TYPE_CHECKING, Dict, Mapping, Optional, Tuple
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from lume_model.variables import ScalarOutputVariable, TableVariable
+
+logger = logging.getLogger(__name__)
+
+# substring identifying BPMs in the device_name column of the lattice files
+BPM_PATTERN = "BPMS"
+
+# lattice columns kept in the compiled cache
+CACHE_COLUMNS = ("device_name", "ele_key", "s_position", "z_position")
+
+# directory holding compiled lattice files, may be overridden with LCLS_ORBIT_CACHE_DIR
+CACHE_DIR = os.environ.get(
+    "LCLS_ORBIT_CACHE_DIR",
+    os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "lcls_orbit"),
+)
+
+
+@dataclass(frozen=True)
+class BPMLattice:
+    """BPMs of one lattice file. Instances are cached and shared between sessions,
+    so they must not be modified.
+
+    Attributes:
+        devices (Tuple[str]): BPM device names in lattice order.
+        z (Tuple[float]): z positions of the BPMs.
+        table (TableVariable): Table variable with X, Y and Z columns.
+        variables (Mapping[str, ScalarOutputVariable]): Read-only mapping of PV name
+            to variable for all X and Y PVs.
+
+    """
+
+    devices: Tuple[str, ...]
+    z: Tuple[float, ...]
+    table: "TableVariable"
+    variables: Mapping[str, "ScalarOutputVariable"]
+
+
+_lattice_cache: Dict[Tuple[str, int], BPMLattice] = {}
+_lattice_lock = threading.Lock()
+
+
+def load_bpms(filename: str, cache_dir: Optional[str] = CACHE_DIR) -> BPMLattice:
+    """Load the BPMs of a lattice csv file. Results are cached per process and keyed
+    on the absolute path and modification time of the file, so an edited file is
+    parsed again.
+
+    Args:
+        filename (str): Path of the lattice csv file.
+        cache_dir (Optional[str]): Directory of the compiled lattice cache, None
+            disables it.
+
+    """
+    path = os.path.abspath(filename)
+    key = (path, os.stat(path).st_mtime_ns)
+
+    with _lattice_lock:
+        lattice = _lattice_cache.get(key)
+
+        if lattice is None:
+            lattice = _bpms_from_lattice(load_lattice(path, cache_dir=cache_dir))
+
+            # drop entries of previous versions of the file
+            for cached in [cached for cached in _lattice_cache if cached[0] == path]:
+                del _lattice_cache[cached]
+
+            _lattice_cache[key] = lattice
+
+    return lattice
+
+
+def load_lattice(filename: str, cache_dir: Optional[str] = CACHE_DIR) -> np.ndarray:
+    """Load the CACHE_COLUMNS of a lattice csv file as a read-only structured array.
+
+    The first load parses the csv with pandas and writes the result as a compiled
+    ``.npy`` file to cache_dir, later loads memory-map that file without importing
+    pandas. Compiled files are named after the checksum of the csv, so a changed
+    file is compiled again.
+
+    Args:
+        filename (str): Path of the lattice csv file.
+        cache_dir (Optional[str]): Directory of the compiled lattice cache, None
+            disables it.
+
+    """
+    path = os.path.abspath(filename)
+
+    if cache_dir is None:
+        return _read_lattice_csv(path)
+
+    with open(path, "rb") as f:
+        checksum = hashlib.sha1(f.read()).hexdigest()
+
+    stem = os.path.splitext(os.path.basename(path))[0]
+    cache_file = os.path.join(cache_dir, f"{stem}.{checksum}.npy")
+
+    try:
+        return np.load(cache_file, mmap_mode="r")
+
+    except FileNotFoundError:
+        pass
+
+    except (OSError, ValueError):
+        logger.warning("Unable to read compiled lattice %s, recompiling.", cache_file)
+
+    lattice = _read_lattice_csv(path)
+
+    try:
+        _write_cache(cache_dir, stem, cache_file, lattice)
+
+    except OSError:
+        logger.warning("Unable to write compiled lattice %s.", cache_file, exc_info=True)
+
+    return lattice
+
+
+def _read_lattice_csv(path: str) -> np.ndarray:
+    import pandas as pd
+
+    logger.debug("Parsing lattice file %s", path)
+
+    df = pd.read_csv(path, usecols=list(CACHE_COLUMNS))
+    names = df["device_name"].fillna("").astype(str)
+    keys = df["ele_key"].fillna("").astype(str)
+
+    lattice = np.empty(
+        len(df),
+        dtype=[
+            ("device_name", f"U{max(names.str.len().max(), 1)}"),
+            ("ele_key", f"U{max(keys.str.len().max(), 1)}"),
+            ("s_position", np.float64),
+            ("z_position", np.float64),
+        ],
+    )
+    lattice["device_name"] = names.to_numpy()
+    lattice["ele_key"] = keys.to_numpy()
+    lattice["s_position"] = df["s_position"].to_numpy(dtype=np.float64)
+    lattice["z_position"] = df["z_position"].to_numpy(dtype=np.float64)
+    lattice.setflags(write=False)
+
+    return lattice
+
+
+def _write_cache(cache_dir: str, stem: str, cache_file: str, lattice: np.ndarray) -> None:
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # write to a temporary file first so concurrent workers never see a partial file
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".npy.tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, lattice)
+
+        os.replace(tmp, cache_file)
+
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+    # remove files compiled from previous versions of the csv
+    for name in os.listdir(cache_dir):
+        if name.startswith(f"{stem}.") and name.endswith(".npy") and os.path.join(cache_dir, name) != cache_file:
+            try:
+                os.remove(os.path.join(cache_dir, name))
+
+            except OSError:
+                pass
+
+
+def _bpms_from_lattice(lattice: np.ndarray) -> BPMLattice:
+    bpms = lattice[np.char.find(lattice["device_name"], BPM_PATTERN) >= 0]
+
+    devices = tuple(bpms["device_name"].tolist())
+    z = tuple(bpms["z_position"].tolist())
+
+    return build_bpm_lattice(devices, z)
+
+
+def build_bpm_lattice(devices: Tuple[str, ...], z: Tuple[float, ...]) -> BPMLattice:
+    """Build the table variable and PV variables for a set of BPMs.
+
+    """
+    from lume_model.variables import ScalarOutputVariable, TableVariable
+
+    table = {"X": {}, "Y": {}, "Z": {}}
+    variables = {}
+
+    for device, position in zip(devices, z):
+        output_x = ScalarOutputVariable(name=f"{device}:X")
+        output_y = ScalarOutputVariable(name=f"{device}:Y")
+        table["X"][device] = output_x
+        table["Y"][device] = output_y
+        table["Z"][device] = position
+        variables[output_x.name] = output_x
+        variables[output_y.name] = output_y
+
+    return BPMLattice(
+        devices=devices,
+        z=z,
+        table=TableVariable(table_rows=list(devices), table_data=table),
+        variables=MappingProxyType(variables),
+    )
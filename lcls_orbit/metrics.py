@@ -0,0 +1,102 @@
+from typing import Dict
+import time
+
+import numpy as np
+
+
+class PhaseTimer:
+    """Stopwatch attributing the time between consecutive laps to phases.
+
+    """
+
+    def __init__(self, metrics: "UpdateMetrics"):
+        self._metrics = metrics
+        self._last = time.perf_counter()
+
+    def lap(self, phase: str) -> None:
+        """Record the time since the previous lap, or since the timer was started, as
+        a sample of phase.
+
+        """
+        now = time.perf_counter()
+        self._metrics.record(phase, now - self._last)
+        self._last = now
+
+
+class UpdateMetrics:
+    """Phase timings and counters of a display. Each phase keeps its last window
+    samples in a preallocated ring, so recording costs a clock read and an array
+    store and memory stays fixed. Percentiles are only computed by stats.
+
+    """
+
+    def __init__(self, window: int = 1024):
+        """
+        Args:
+            window (int): Number of samples kept per phase.
+
+        """
+        self.window = window
+        self.counters: Dict[str, int] = {}
+        self._samples: Dict[str, np.ndarray] = {}
+        self._recorded: Dict[str, int] = {}
+
+    def timer(self) -> PhaseTimer:
+        """Start a timer whose laps are recorded to these metrics.
+
+        """
+        return PhaseTimer(self)
+
+    def record(self, phase: str, seconds: float) -> None:
+        samples = self._samples.get(phase)
+        if samples is None:
+            samples = self._samples[phase] = np.zeros(self.window)
+            self._recorded[phase] = 0
+
+        samples[self._recorded[phase] % self.window] = seconds
+        self._recorded[phase] += 1
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self) -> None:
+        self.counters.clear()
+        self._samples.clear()
+        self._recorded.clear()
+
+    def stats(self) -> Dict[str, dict]:
+        """Counters, and the number of samples, mean, p50, p99 and max in ms of every
+        phase over its window.
+
+        """
+        phases = {}
+        for phase, samples in self._samples.items():
+            recorded = self._recorded[phase]
+            window = samples[:min(recorded, self.window)] * 1000
+            p50, p99 = np.percentile(window, (50, 99))
+            phases[phase] = {
+                "count": recorded,
+                "mean_ms": float(window.mean()),
+                "p50_ms": float(p50),
+                "p99_ms": float(p99),
+                "max_ms": float(window.max()),
+            }
+
+        return {"phases": phases, "counters": dict(self.counters)}
+
+    def to_html(self) -> str:
+        """Stats as an HTML table, for display in a Div.
+
+        """
+        stats = self.stats()
+        rows = "".join(
+            f"<tr><td>{phase}</td><td>{values['p50_ms']:.2f}</td><td>{values['p99_ms']:.2f}</td>"
+            f"<td>{values['max_ms']:.2f}</td><td>{values['count']}</td></tr>"
+            for phase, values in stats["phases"].items()
+        )
+        counters = ", ".join(f"{name}: {value}" for name, value in stats["counters"].items())
+
+        return (
+            "<table><tr><th>phase</th><th>p50 (ms)</th><th>p99 (ms)</th><th>max (ms)</th><th>n</th></tr>"
+            f"{rows}</table><div>{counters}</div>"
+        )
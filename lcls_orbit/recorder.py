@@ -0,0 +1,297 @@
+from typing import TYPE_CHECKING, Dict, Sequence
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from lcls_orbit.acquisition import PLANES, OrbitSnapshot
+
+if TYPE_CHECKING:
+    from lcls_orbit.acquisition import OrbitAcquisition
+
+logger = logging.getLogger(__name__)
+
+# version of the recording layout, stored with every recording
+FORMAT_VERSION = 1
+
+# file extensions recorded as a single HDF5 file, anything else is a chunk directory
+HDF5_EXTENSIONS = (".h5", ".hdf5")
+
+# name of the metadata file of chunk directories
+METADATA_FILE = "metadata.json"
+
+# name pattern of the chunk files of chunk directories, in recording order
+CHUNK_FILE = "chunk_{:06d}.npz"
+
+# per shot fields of a recording and their dtype, shapes are (shots,) or
+# (shots, len(PLANES), n_devices)
+FIELDS = {
+    "timestamp": np.float64,
+    "sequence": np.int64,
+    "shading": np.float64,
+    "orbit": np.float64,
+    "valid": np.bool_,
+}
+
+# sentinel closing the writer thread
+_CLOSE = object()
+
+
+class OrbitRecorder:
+    """Recorder appending the snapshots of an acquisition to a chunked, compressed
+    recording. Snapshots are handed to a background writer thread through a
+    bounded queue and written in batches of chunk_size shots, so recording never
+    blocks polling or rendering. Snapshots arriving while the queue is full are
+    dropped and counted. If writing fails the recorder is marked as failed and
+    ignores further snapshots.
+
+    Paths ending in ``.h5`` or ``.hdf5`` are written as a single HDF5 file with
+    resizable datasets, which requires h5py. Other paths are written as a
+    directory with one compressed ``.npz`` file per chunk and a metadata file.
+
+    """
+
+    def __init__(
+        self,
+        path: str,
+        devices: Sequence[str],
+        z: np.ndarray,
+        chunk_size: int = 256,
+        max_queue: int = 4096,
+        flush_interval: float = 10.0,
+        compression: bool = True,
+    ):
+        """
+        Args:
+            path (str): Path of the recording, must not exist.
+            devices (Sequence[str]): Device names, one per orbit column.
+            z (np.ndarray): z positions of the devices.
+            chunk_size (int): Shots per chunk written.
+            max_queue (int): Largest number of snapshots waiting for the writer.
+            flush_interval (float): Longest time in seconds buffered shots wait
+                before being written as a partial chunk.
+            compression (bool): Whether chunks are compressed.
+
+        """
+        if os.path.exists(path):
+            raise FileExistsError(f"Recording {path} already exists.")
+
+        self.path = path
+        self.devices = tuple(devices)
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+
+        self.recorded = 0
+        self.dropped = 0
+        self.failed = False
+
+        if path.endswith(HDF5_EXTENSIONS):
+            self._writer = _HDF5Writer(path, self.devices, z, chunk_size, compression)
+        else:
+            self._writer = _ChunkDirectoryWriter(path, self.devices, z, compression)
+
+        # chunk buffer filled by the writer thread
+        shape = (len(PLANES), len(self.devices))
+        self._buffer = {
+            name: np.empty((chunk_size,) + (shape if name in ("orbit", "valid") else ()), dtype=dtype)
+            for name, dtype in FIELDS.items()
+        }
+        self._buffered = 0
+
+        self._acquisitions = []
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="orbit-recorder", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def for_acquisition(cls, path: str, acquisition: "OrbitAcquisition", **kwargs) -> "OrbitRecorder":
+        """Create a recorder for the devices of an acquisition and attach it.
+
+        """
+        recorder = cls(path, acquisition.devices, acquisition.z, **kwargs)
+        recorder.attach(acquisition)
+        return recorder
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self.failed
+
+    def attach(self, acquisition: "OrbitAcquisition") -> None:
+        """Record every snapshot published by an acquisition.
+
+        """
+        acquisition.subscribe(self.record)
+        self._acquisitions.append(acquisition)
+
+    def record(self, snapshot: OrbitSnapshot) -> None:
+        """Queue a snapshot for writing without blocking. Snapshots of other devices
+        are ignored.
+
+        """
+        if self._thread is None or self.failed or tuple(snapshot.devices) != self.devices:
+            return
+
+        try:
+            self._queue.put_nowait(snapshot)
+
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self) -> None:
+        """Detach from all acquisitions, write the queued snapshots and close the
+        recording.
+
+        """
+        for acquisition in self._acquisitions:
+            acquisition.unsubscribe(self.record)
+
+        self._acquisitions = []
+
+        if self._thread is not None:
+            # a failed writer no longer empties the queue
+            while self._thread.is_alive():
+                try:
+                    self._queue.put(_CLOSE, timeout=0.1)
+                    break
+
+                except queue.Full:
+                    continue
+
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> "OrbitRecorder":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _run(self) -> None:
+        deadline = None
+
+        try:
+            while True:
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+
+                try:
+                    snapshot = self._queue.get(timeout=timeout)
+
+                except queue.Empty:
+                    snapshot = None
+
+                if snapshot is _CLOSE:
+                    break
+
+                if snapshot is not None:
+                    self._buffer_snapshot(snapshot)
+
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+
+                if self._buffered == self.chunk_size or (self._buffered and time.monotonic() >= deadline):
+                    self._flush()
+                    deadline = None
+
+            self._flush()
+
+        except Exception:
+            self.failed = True
+            logger.exception("Orbit recorder %s failed, recording stopped.", self.path)
+
+        finally:
+            self._writer.close()
+
+    def _buffer_snapshot(self, snapshot: OrbitSnapshot) -> None:
+        i = self._buffered
+        self._buffer["timestamp"][i] = snapshot.timestamp
+        self._buffer["sequence"][i] = snapshot.sequence
+        self._buffer["shading"][i] = snapshot.shading
+        self._buffer["orbit"][i] = snapshot.orbit
+        np.isfinite(snapshot.orbit, out=self._buffer["valid"][i])
+        self._buffered += 1
+
+    def _flush(self) -> None:
+        if not self._buffered:
+            return
+
+        self._writer.append({name: values[:self._buffered] for name, values in self._buffer.items()})
+        self.recorded += self._buffered
+        self._buffered = 0
+
+
+class _HDF5Writer:
+    """Appends chunks to resizable HDF5 datasets.
+
+    """
+
+    def __init__(self, path: str, devices: Sequence[str], z: np.ndarray, chunk_size: int, compression: bool):
+        import h5py
+
+        self._file = h5py.File(path, "w-")
+        self._file.attrs["format_version"] = FORMAT_VERSION
+        self._file.attrs["planes"] = list(PLANES)
+        self._file.create_dataset("devices", data=np.array(devices, dtype=object), dtype=h5py.string_dtype())
+        self._file.create_dataset("z", data=np.asarray(z, dtype=np.float64))
+
+        shape = (len(PLANES), len(devices))
+        for name, dtype in FIELDS.items():
+            item_shape = shape if name in ("orbit", "valid") else ()
+            self._file.create_dataset(
+                name,
+                shape=(0,) + item_shape,
+                maxshape=(None,) + item_shape,
+                chunks=(chunk_size,) + item_shape,
+                dtype=dtype,
+                compression="gzip" if compression else None,
+                shuffle=compression,
+            )
+
+    def append(self, batch: Dict[str, np.ndarray]) -> None:
+        for name, values in batch.items():
+            dataset = self._file[name]
+            start = dataset.shape[0]
+            dataset.resize(start + len(values), axis=0)
+            dataset[start:] = values
+
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _ChunkDirectoryWriter:
+    """Writes each chunk to its own ``.npz`` file of a directory.
+
+    """
+
+    def __init__(self, path: str, devices: Sequence[str], z: np.ndarray, compression: bool):
+        os.makedirs(path)
+
+        self._path = path
+        self._save = np.savez_compressed if compression else np.savez
+        self._n_chunks = 0
+
+        metadata = {
+            "format_version": FORMAT_VERSION,
+            "planes": list(PLANES),
+            "devices": list(devices),
+            "z": np.asarray(z, dtype=np.float64).tolist(),
+        }
+        with open(os.path.join(path, METADATA_FILE), "w") as f:
+            json.dump(metadata, f)
+
+    def append(self, batch: Dict[str, np.ndarray]) -> None:
+        # renamed once complete, so readers only ever see whole chunks
+        filename = os.path.join(self._path, CHUNK_FILE.format(self._n_chunks))
+        with open(filename + ".tmp", "wb") as f:
+            self._save(f, **batch)
+
+        os.replace(filename + ".tmp", filename)
+        self._n_chunks += 1
+
+    def close(self) -> None:
+        pass
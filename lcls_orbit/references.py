@@ -0,0 +1,299 @@
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Tuple
+import dataclasses
+import functools
+import io
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+
+import numpy as np
+
+from lcls_orbit.acquisition import PLANES
+
+# database of saved references, may be overridden with LCLS_ORBIT_REFERENCE_DB
+REFERENCE_DB = os.environ.get(
+    "LCLS_ORBIT_REFERENCE_DB",
+    os.path.join(
+        os.environ.get("XDG_DATA_HOME", os.path.expanduser("~/.local/share")), "lcls_orbit", "references.sqlite"
+    ),
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS refs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    beamline TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    tag TEXT NOT NULL DEFAULT '',
+    devices TEXT NOT NULL,
+    arrays BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS refs_beamline_timestamp ON refs (beamline, timestamp);
+"""
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    array.setflags(write=False)
+    return array
+
+
+@dataclasses.dataclass(frozen=True, eq=False)
+class Reference:
+    """Immutable orbit reference. All arrays are read-only with a row per plane and
+    a column per device, so a reference can be shared between any number of
+    displays and sessions without copying.
+
+    Attributes:
+        devices (Tuple[str]): Device names of the array columns.
+        orbit (np.ndarray): Reference orbit, the mean of the collected samples.
+        std (np.ndarray): Standard deviation of the collected samples, NaN where
+            unknown.
+        count (np.ndarray): Number of valid samples per device and plane.
+        metadata (Mapping[str, Any]): Read-only mapping with e.g. the beamline,
+            timestamp, tag and id of a stored reference.
+
+    """
+
+    devices: Tuple[str, ...]
+    orbit: np.ndarray
+    std: np.ndarray
+    count: np.ndarray
+    metadata: Mapping[str, Any] = dataclasses.field(default_factory=lambda: MappingProxyType({}))
+
+    @classmethod
+    def from_samples(cls, devices: Tuple[str, ...], samples: np.ndarray, fallback: "Reference" = None, **metadata):
+        """Reference from a (len(PLANES), n_samples, n_devices) array of samples, NaN
+        where a reading was missing. Devices without valid samples take the orbit of
+        the fallback reference, or 0.
+
+        """
+        count = np.count_nonzero(~np.isnan(samples), axis=1)
+        total = np.nansum(samples, axis=1)
+        orbit = np.divide(total, count, out=np.zeros(total.shape), where=count > 0)
+        deviations = np.nansum((samples - orbit[:, None, :]) ** 2, axis=1)
+        std = np.sqrt(np.divide(deviations, count, out=np.full(total.shape, np.nan), where=count > 0))
+
+        if fallback is not None:
+            np.copyto(orbit, fallback.orbit, where=count == 0)
+
+        return cls(
+            devices, _read_only(orbit), _read_only(std), _read_only(count), MappingProxyType(dict(metadata))
+        )
+
+    @property
+    def is_zero(self) -> bool:
+        return self is zero_reference(self.devices)
+
+    def with_metadata(self, **metadata) -> "Reference":
+        """Reference sharing the arrays of this one, with updated metadata.
+
+        """
+        return dataclasses.replace(self, metadata=MappingProxyType({**self.metadata, **metadata}))
+
+    def aligned(self, devices: Tuple[str, ...], device_index: Mapping[str, int]) -> "Reference":
+        """Reference over other devices, which are located by device_index. Returns
+        this reference if the devices match, devices it does not cover are
+        referenced to 0 with no samples.
+
+        """
+        if devices is self.devices or devices == self.devices:
+            return self
+
+        index = np.array([device_index.get(device, -1) for device in self.devices], dtype=np.intp)
+        found = index >= 0
+        shape = (len(PLANES), len(devices))
+
+        orbit = np.zeros(shape)
+        std = np.full(shape, np.nan)
+        count = np.zeros(shape, dtype=self.count.dtype)
+        orbit[:, index[found]] = self.orbit[:, found]
+        std[:, index[found]] = self.std[:, found]
+        count[:, index[found]] = self.count[:, found]
+
+        return Reference(devices, _read_only(orbit), _read_only(std), _read_only(count), self.metadata)
+
+
+@functools.lru_cache(maxsize=16)
+def zero_reference(devices: Tuple[str, ...]) -> Reference:
+    """Shared all-zero reference of a set of devices.
+
+    """
+    shape = (len(PLANES), len(devices))
+    return Reference(
+        devices,
+        _read_only(np.zeros(shape)),
+        _read_only(np.full(shape, np.nan)),
+        _read_only(np.zeros(shape, dtype=np.int64)),
+    )
+
+
+class ReferenceInfo(NamedTuple):
+    """Metadata of a stored reference.
+
+    """
+
+    id: int
+    beamline: str
+    timestamp: float
+    tag: str
+
+    @property
+    def label(self) -> str:
+        label = time.strftime("%m/%d/%Y, %H:%M:%S", time.localtime(self.timestamp))
+        return f"{label} ({self.tag})" if self.tag else label
+
+
+class ReferenceStore:
+    """Persistent store of orbit references in an SQLite database, keyed by beamline,
+    timestamp and tag. Listing only reads the metadata, references are loaded by id
+    on demand and kept in an LRU cache, so sessions loading the same reference share
+    one immutable Reference. A database file can be shared by any number of
+    sessions and server processes.
+
+    """
+
+    def __init__(self, path: str = REFERENCE_DB, cache_size: int = 32):
+        """
+        Args:
+            path (str): Path of the database file, ":memory:" for a store private to
+                this instance.
+            cache_size (int): Number of loaded references kept in memory.
+
+        """
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self.path = path
+        self.cache_size = cache_size
+
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[int, Reference]" = OrderedDict()
+
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=10.0)
+        with self._lock, self._connection:
+            if path != ":memory:":
+                # readers of other processes are not blocked by writes
+                self._connection.execute("PRAGMA journal_mode=WAL")
+
+            self._connection.executescript(_SCHEMA)
+
+    def save(self, reference: Reference, beamline: str, timestamp: Optional[float] = None, tag: str = "") -> Reference:
+        """Store a reference.
+
+        Args:
+            reference (Reference): Reference to store.
+            beamline (str): Beamline of the reference.
+            timestamp (Optional[float]): Collection time in seconds since the epoch,
+                now if None.
+            tag (str): Free text label.
+
+        Returns:
+            The stored reference, sharing the arrays of reference with the metadata
+            of the stored row.
+
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+
+        buffer = io.BytesIO()
+        np.savez(buffer, orbit=reference.orbit, std=reference.std, count=reference.count)
+
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO refs (beamline, timestamp, tag, devices, arrays) VALUES (?, ?, ?, ?, ?)",
+                (beamline, timestamp, tag, "\n".join(reference.devices), buffer.getvalue()),
+            )
+
+        info = ReferenceInfo(cursor.lastrowid, beamline, timestamp, tag)
+        stored = reference.with_metadata(**info._asdict())
+        self._cache_reference(info.id, stored)
+
+        return stored
+
+    def list(self, beamline: str) -> List[ReferenceInfo]:
+        """Metadata of the references of a beamline, newest first.
+
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, beamline, timestamp, tag FROM refs WHERE beamline = ? ORDER BY timestamp DESC",
+                (beamline,),
+            ).fetchall()
+
+        return [ReferenceInfo(*row) for row in rows]
+
+    def load(self, reference_id: int) -> Reference:
+        """Load a reference by id.
+
+        Raises:
+            KeyError: If no reference has the id.
+
+        """
+        with self._lock:
+            cached = self._cache.get(reference_id)
+            if cached is not None:
+                self._cache.move_to_end(reference_id)
+                return cached
+
+            row = self._connection.execute(
+                "SELECT id, beamline, timestamp, tag, devices, arrays FROM refs WHERE id = ?", (reference_id,)
+            ).fetchone()
+
+        if row is None:
+            raise KeyError(reference_id)
+
+        info = ReferenceInfo(*row[:4])
+        devices = tuple(row[4].split("\n")) if row[4] else ()
+
+        with np.load(io.BytesIO(row[5])) as npz:
+            reference = Reference(
+                devices,
+                _read_only(npz["orbit"]),
+                _read_only(npz["std"]),
+                _read_only(npz["count"]),
+                MappingProxyType(info._asdict()),
+            )
+
+        return self._cache_reference(reference_id, reference)
+
+    def _cache_reference(self, reference_id: int, reference: Reference) -> Reference:
+        with self._lock:
+            # keep the instance another thread cached first, so it stays shared
+            reference = self._cache.setdefault(reference_id, reference)
+            self._cache.move_to_end(reference_id)
+
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        return reference
+
+    def delete(self, reference_id: int) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM refs WHERE id = ?", (reference_id,))
+            self._cache.pop(reference_id, None)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+            self._cache.clear()
+
+
+_shared_stores: Dict[str, ReferenceStore] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_reference_store(path: str = REFERENCE_DB) -> ReferenceStore:
+    """Return the process wide store of a database file, so all sessions of a process
+    share its cache.
+
+    """
+    path = os.path.abspath(path)
+
+    with _shared_lock:
+        store = _shared_stores.get(path)
+
+        if store is None:
+            store = _shared_stores[path] = ReferenceStore(path)
+
+    return store
@@ -0,0 +1,305 @@
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Tuple, Union
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from lcls_orbit.acquisition import PLANES, OrbitAcquisition, OrbitSnapshot
+from lcls_orbit.recorder import CHUNK_FILE, HDF5_EXTENSIONS, METADATA_FILE
+from lcls_orbit.lattice import build_bpm_lattice
+
+if TYPE_CHECKING:
+    from lume_model.variables import ScalarVariable, TableVariable
+
+
+class OrbitRecording:
+    """Read access to a recording written by OrbitRecorder. Nothing but the metadata
+    is read on open, fields are read by shot range and only the chunks covering
+    the range are loaded, so recordings larger than memory can be replayed.
+
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): Path of an HDF5 recording or a chunk directory.
+
+        """
+        self.path = path
+
+        # most recently loaded chunk of a chunk directory
+        self._chunk_index = None
+        self._chunk = None
+
+        if path.endswith(HDF5_EXTENSIONS):
+            import h5py
+
+            self._file = h5py.File(path, "r")
+            self.devices = tuple(self._file["devices"].asstr()[()])
+            self.z = self._file["z"][()]
+            self._length = self._file["timestamp"].shape[0]
+
+            # HDF5 chunks have a fixed number of shots
+            chunk_size = self._file["timestamp"].chunks[0]
+            self._offsets = np.arange(0, self._length + chunk_size, chunk_size)
+            self._offsets[-1] = self._length
+
+        else:
+            self._file = None
+
+            with open(os.path.join(path, METADATA_FILE)) as f:
+                metadata = json.load(f)
+
+            self.devices = tuple(metadata["devices"])
+            self.z = np.array(metadata["z"], dtype=np.float64)
+
+            self._chunk_files = []
+            while os.path.exists(os.path.join(path, CHUNK_FILE.format(len(self._chunk_files)))):
+                self._chunk_files.append(os.path.join(path, CHUNK_FILE.format(len(self._chunk_files))))
+
+            # npz members are loaded lazily, so this only reads the timestamps
+            lengths = [len(self._load_chunk(i)["timestamp"]) for i in range(len(self._chunk_files))]
+            self._offsets = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+            self._length = int(self._offsets[-1])
+
+        self.z.setflags(write=False)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def chunk_bounds(self, index: int) -> Tuple[int, int]:
+        """First and past-the-end shot of the chunk holding a shot.
+
+        """
+        chunk = int(np.searchsorted(self._offsets, index, side="right")) - 1
+        return int(self._offsets[chunk]), int(self._offsets[chunk + 1])
+
+    def read(self, name: str, start: int, stop: int) -> np.ndarray:
+        """Read shots start to stop of a field.
+
+        """
+        if self._file is not None:
+            return self._file[name][start:stop]
+
+        first = int(np.searchsorted(self._offsets, start, side="right")) - 1
+        parts = []
+        for i in range(first, len(self._chunk_files)):
+            offset = int(self._offsets[i])
+            if offset >= stop:
+                break
+
+            values = self._load_chunk(i)[name]
+            parts.append(values[max(start - offset, 0):stop - offset])
+
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+        if self._chunk is not None:
+            self._chunk.close()
+            self._chunk = None
+            self._chunk_index = None
+
+    def _load_chunk(self, index: int) -> Dict[str, np.ndarray]:
+        if self._chunk_index != index:
+            if self._chunk is not None:
+                self._chunk.close()
+
+            self._chunk = np.load(self._chunk_files[index])
+            self._chunk_index = index
+
+        return self._chunk
+
+
+class ReplayAcquisition(OrbitAcquisition):
+    """Acquisition publishing the shots of a recording, so an OrbitDisplay can be
+    driven without a live machine. Shots are read one chunk at a time.
+
+    At a finite speed each poll publishes the newest shot whose recorded time has
+    passed on the replay clock, skipping shots like a live poll at the same period
+    would. With speed None each poll publishes the next shot, for replaying as fast
+    as possible.
+
+    """
+
+    def __init__(
+        self,
+        recording: Union[str, OrbitRecording],
+        shading_var: "ScalarVariable" = None,
+        speed: Optional[float] = 1.0,
+        loop: bool = False,
+        period: float = 0.5,
+        threaded: bool = False,
+        jitter_alpha: Optional[float] = 0.05,
+    ):
+        """
+        Args:
+            recording (Union[str, OrbitRecording]): Recording or its path.
+            shading_var (ScalarVariable): Variable of the recorded shading PV.
+            speed (Optional[float]): Replay speed relative to real time, None
+                replays one shot per poll.
+            loop (bool): Whether to restart from the first shot at the end.
+            period (float): Poll period in seconds used by start.
+            threaded (bool): Whether start polls in a background thread instead of
+                on the current IO loop.
+            jitter_alpha (Optional[float]): Weight of the newest snapshot in the
+                orbit jitter statistics, None disables them.
+
+        """
+        if isinstance(recording, str):
+            recording = OrbitRecording(recording)
+
+        if not len(recording):
+            raise ValueError(f"Recording {recording.path} holds no shots.")
+
+        if speed is not None and speed <= 0:
+            raise ValueError("Replay speed must be positive.")
+
+        lattice = build_bpm_lattice(recording.devices, tuple(recording.z.tolist()))
+        self._setup(lattice.table, period, threaded, jitter_alpha)
+        self.set_shading_var(shading_var)
+
+        self._recording = recording
+        self.speed = speed
+        self.loop = loop
+
+        # index of the next shot and the wall and recorded time the replay clock
+        # started from
+        self._position = 0
+        self._clock = None
+        self._replay_lock = threading.Lock()
+
+        # fields of the chunk holding the current position
+        self._block = {}
+        self._block_bounds = (0, 0)
+
+    @property
+    def recording(self) -> OrbitRecording:
+        return self._recording
+
+    @property
+    def position(self) -> int:
+        """Index of the next shot.
+
+        """
+        return self._position
+
+    @property
+    def finished(self) -> bool:
+        return not self.loop and self._position >= len(self._recording)
+
+    def set_shading_var(self, shading_var) -> None:
+        """Assign the shading PV variable. The recorded shading values are replayed
+        regardless.
+
+        """
+        self._shading_var = shading_var
+
+    def with_table(self, table: "TableVariable") -> "OrbitAcquisition":
+        raise ValueError("Replayed acquisitions can not read another table.")
+
+    def seek(self, index: int) -> None:
+        """Continue the replay from a shot, restarting the replay clock.
+
+        """
+        with self._replay_lock:
+            self._position = min(max(index, 0), len(self._recording))
+            self._clock = None
+
+    def reader(self) -> Callable[[], Tuple[np.ndarray, float]]:
+        return self.read
+
+    def read(self) -> Tuple[np.ndarray, float]:
+        """Orbit and shading value of the latest replayed shot, NaN before the first.
+        Does not advance the replay.
+
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            orbit = np.full((len(PLANES), len(self._devices)), np.nan)
+            orbit.setflags(write=False)
+            return orbit, np.nan
+
+        return snapshot.orbit, snapshot.shading
+
+    def poll(self) -> OrbitSnapshot:
+        """Publish the shot due on the replay clock. Returns the latest snapshot if no
+        new shot is due or the recording finished.
+
+        """
+        with self._replay_lock:
+            if self._position >= len(self._recording) and self.loop:
+                self._position = 0
+                self._clock = None
+
+            index = self._due_index()
+            if index < self._position:
+                if self._snapshot is not None:
+                    return self._snapshot
+
+                # seeked to the end before the first poll
+                index = len(self._recording) - 1
+
+            orbit = self._read_block("orbit", index).copy()
+            shading = float(self._read_block("shading", index))
+            timestamp = float(self._read_block("timestamp", index))
+            self._position = index + 1
+
+        orbit.setflags(write=False)
+
+        return self._publish(orbit, shading, timestamp=timestamp)
+
+    def _due_index(self) -> int:
+        """Index of the newest shot due on the replay clock, below the position if no
+        shot is due.
+
+        """
+        n_shots = len(self._recording)
+        if self._position >= n_shots:
+            return self._position - 1
+
+        if self.speed is None:
+            return self._position
+
+        now = time.monotonic()
+        if self._clock is None:
+            self._clock = (now, float(self._read_block("timestamp", self._position)))
+            return self._position
+
+        target = self._clock[1] + (now - self._clock[0]) * self.speed
+
+        # advance chunk by chunk until a chunk holds a shot beyond the target
+        index = self._position - 1
+        while index + 1 < n_shots:
+            self._read_block("timestamp", index + 1)
+            start, stop = self._block_bounds
+            timestamps = self._block["timestamp"]
+
+            due = int(np.searchsorted(timestamps, target, side="right"))
+            if due == 0:
+                break
+
+            index = max(index, start + due - 1)
+            if due < stop - start:
+                break
+
+        return index
+
+    def _read_block(self, name: str, index: int) -> np.ndarray:
+        """Read a shot of a field from the chunk holding it, loading the chunk's
+        field on first access.
+
+        """
+        start, stop = self._block_bounds
+        if not start <= index < stop:
+            self._block = {}
+            self._block_bounds = start, stop = self._recording.chunk_bounds(index)
+
+        if name not in self._block:
+            self._block[name] = self._recording.read(name, start, stop)
+
+        return self._block[name][index - start]
@@ -0,0 +1,155 @@
+from typing import TYPE_CHECKING
+import logging
+import time
+
+if TYPE_CHECKING:
+    from bokeh.document import Document
+    from lcls_orbit.widgets import OrbitDisplay
+
+logger = logging.getLogger(__name__)
+
+# factor applied to the period when the server is overloaded
+BACKOFF = 1.5
+
+# factor applied to the period while converging back to the target period
+SPEEDUP = 0.8
+
+
+class RenderScheduler:
+    """Adaptive refresh loop for an OrbitDisplay.
+
+    Each tick reads the latest snapshot of the display's active acquisition and
+    only redraws if it differs from what is shown by more than the deadband. The
+    period backs off when updates take more than load_fraction of it or when the
+    document's event loop runs callbacks late, and converges back to the target
+    period when there is headroom. The next tick is only scheduled once the
+    current one finished, so ticks never queue up.
+
+    """
+
+    def __init__(
+        self,
+        display: "OrbitDisplay",
+        doc: "Document",
+        target_period: float = 0.5,
+        max_period: float = 5.0,
+        deadband: float = 0.0,
+        load_fraction: float = 0.2,
+        max_lag: float = 0.1,
+    ):
+        """
+        Args:
+            display (OrbitDisplay): Display to refresh.
+            doc (Document): Document of the display's session.
+            target_period (float): Shortest refresh period in seconds.
+            max_period (float): Longest refresh period in seconds.
+            deadband (float): Orbit changes up to this value are not redrawn.
+            load_fraction (float): Largest fraction of the period spent in update.
+            max_lag (float): Largest delay of a tick in seconds before backing off.
+
+        """
+        self._display = display
+        self._doc = doc
+
+        self.target_period = target_period
+        self.max_period = max_period
+        self.deadband = deadband
+        self.load_fraction = load_fraction
+        self.max_lag = max_lag
+
+        self.period = target_period
+        self.ticks = 0
+        self.skipped = 0
+        self.cost = 0.0
+        self.lag = 0.0
+
+        self._handle = None
+        self._due = None
+        self._watching_session = False
+
+    @property
+    def running(self) -> bool:
+        return self._handle is not None
+
+    def start(self) -> None:
+        """Start refreshing. The loop stops when the session is destroyed.
+
+        """
+        if self.running:
+            return
+
+        if not self._watching_session:
+            self._doc.on_session_destroyed(lambda session_context: self.stop())
+            self._watching_session = True
+
+        # widgets independent of the orbit are refreshed even when ticks are skipped
+        self._display.add_refresh_callbacks(self._doc)
+
+        self._schedule(self.period)
+
+    def stop(self) -> None:
+        if self._handle is not None:
+            try:
+                self._doc.remove_timeout_callback(self._handle)
+
+            except ValueError:
+                # callback already ran
+                pass
+
+            self._handle = None
+
+    def _schedule(self, delay: float) -> None:
+        self._due = time.monotonic() + delay
+        self._handle = self._doc.add_timeout_callback(self._tick, delay * 1000)
+
+    def _tick(self) -> None:
+        start = time.monotonic()
+        self.lag = max(start - self._due, 0.0)
+
+        try:
+            snapshot = self._display.acquisition.snapshot()
+            self._display.metrics.record("poll", time.monotonic() - start)
+
+            if self._display.has_changed(snapshot, self.deadband):
+                self._display.update(snapshot)
+                self.ticks += 1
+
+                # smoothed cost of an update, including a synchronous poll
+                cost = time.monotonic() - start
+                self.cost = cost if self.ticks == 1 else 0.8 * self.cost + 0.2 * cost
+
+            else:
+                self.skipped += 1
+                self._display.metrics.count("skipped")
+
+        except Exception:
+            logger.exception("Orbit display update failed.")
+
+        finally:
+            if self._handle is not None:
+                self.period = self._next_period()
+                self._schedule(self.period)
+
+    def _next_period(self) -> float:
+        # shortest period keeping the update cost within the load fraction
+        required = self.cost / self.load_fraction
+
+        if self.lag > self.max_lag or required > self.period:
+            period = max(self.period * BACKOFF, required)
+
+        else:
+            period = max(self.period * SPEEDUP, required, self.target_period)
+
+        return min(period, self.max_period)
+
+    def stats(self) -> dict:
+        """Current period and counters of the loop.
+
+        """
+        return {
+            "period": self.period,
+            "ticks": self.ticks,
+            "skipped": self.skipped,
+            "cost": self.cost,
+            "lag": self.lag,
+        }
@@ -0,0 +1,302 @@
+from typing import TYPE_CHECKING, Dict, Optional, Sequence, Tuple
+import logging
+import threading
+import time
+
+import numpy as np
+
+from lcls_orbit.acquisition import PLANES
+
+if TYPE_CHECKING:
+    from bokeh.document import Document
+    from lcls_orbit.widgets import OrbitDisplay
+
+logger = logging.getLogger(__name__)
+
+# shading PVs of the example display
+SHADING_PVS = ("GDET:FEE1:241:ENRC", "EM1K0:GMD:HPS:milliJoulesPerPulse")
+
+
+class BPMSimulator:
+    """Simulated BPM readings for offline development and load tests. Each device
+    reads a fixed random offset plus a random walk drift plus white noise, per
+    plane. Readings are held between updates, which happen update_rate times per
+    second or on calls of step, and dropped readings read as missing. All devices
+    are updated at once with vectorized operations.
+
+    Serves ``{device}:{plane}`` for every device and plane, and the shading PVs
+    with values in shading_range.
+
+    """
+
+    def __init__(
+        self,
+        devices: Sequence[str],
+        shading_pvs: Sequence[str] = SHADING_PVS,
+        offset: float = 0.3,
+        noise: float = 0.02,
+        drift: float = 0.002,
+        dropout: float = 0.0,
+        update_rate: Optional[float] = 10.0,
+        shading_range: Tuple[float, float] = (0.0, 5.0),
+        seed: Optional[int] = None,
+    ):
+        """
+        Args:
+            devices (Sequence[str]): BPM device names.
+            shading_pvs (Sequence[str]): Names of the simulated shading PVs.
+            offset (float): Standard deviation of the static orbit offsets in mm.
+            noise (float): Standard deviation of the reading noise in mm.
+            drift (float): Standard deviation of the drift step per update in mm.
+            dropout (float): Probability of a reading being missing.
+            update_rate (Optional[float]): Updates per second, None only updates on
+                calls of step.
+            shading_range (Tuple[float, float]): Range of the shading values.
+            seed (Optional[int]): Seed of the random generator.
+
+        """
+        if update_rate is not None and update_rate <= 0:
+            raise ValueError("Update rate must be positive.")
+
+        self.devices = tuple(devices)
+        self.shading_pvs = tuple(shading_pvs)
+        self.noise = noise
+        self.drift = drift
+        self.dropout = dropout
+        self.update_rate = update_rate
+        self.shading_range = shading_range
+
+        shape = (len(PLANES), len(self.devices))
+        self._rng = np.random.default_rng(seed)
+        self._offsets = self._rng.normal(0, offset, shape)
+        self._drift = np.zeros(shape)
+        self._orbit = np.full(shape, np.nan)
+        self._shading = np.full(len(self.shading_pvs), np.nan)
+
+        self._index = {
+            f"{device}:{plane}": (i, j) for i, plane in enumerate(PLANES) for j, device in enumerate(self.devices)
+        }
+        self._shading_index = {pvname: i for i, pvname in enumerate(self.shading_pvs)}
+
+        self._time = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_lattice(cls, filename: str, **kwargs) -> "BPMSimulator":
+        """Simulate the BPMs of a lattice csv file.
+
+        """
+        from lcls_orbit.lattice import load_bpms
+
+        return cls(load_bpms(filename).devices, **kwargs)
+
+    @property
+    def pvnames(self) -> Tuple[str, ...]:
+        return tuple(self._index) + self.shading_pvs
+
+    def advance(self, now: float = None) -> bool:
+        """Apply the updates due until now, returns whether the readings changed.
+
+        """
+        now = time.monotonic() if now is None else now
+
+        with self._lock:
+            if self._time is None:
+                steps = 1
+                self._time = now
+
+            elif self.update_rate is None:
+                return False
+
+            else:
+                steps = int((now - self._time) * self.update_rate)
+                if not steps:
+                    return False
+
+                self._time += steps / self.update_rate
+
+            self._update(steps)
+
+        return True
+
+    def step(self, steps: int = 1) -> None:
+        """Apply a number of updates immediately.
+
+        """
+        with self._lock:
+            if self._time is None:
+                self._time = time.monotonic()
+
+            self._update(steps)
+
+    def _update(self, steps: int) -> None:
+        shape = self._orbit.shape
+
+        # the drift of several updates is a single step of the random walk
+        self._drift += self._rng.normal(0, self.drift * np.sqrt(steps), shape)
+        np.add(self._offsets, self._drift, out=self._orbit)
+        self._orbit += self._rng.normal(0, self.noise, shape)
+
+        if self.dropout:
+            self._orbit[self._rng.random(shape) < self.dropout] = np.nan
+
+        low, high = self.shading_range
+        self._shading = np.clip(
+            self._rng.normal((low + high) / 2, (high - low) / 10, len(self.shading_pvs)), low, high
+        )
+
+    def orbit(self) -> np.ndarray:
+        """Copy of the current (len(PLANES), n_devices) readings, NaN where dropped.
+
+        """
+        self.advance()
+        with self._lock:
+            return self._orbit.copy()
+
+    def get_value(self, pvname: str) -> Optional[float]:
+        """Current value of a PV, None for dropped readings and unknown PVs.
+
+        """
+        self.advance()
+
+        with self._lock:
+            if pvname in self._index:
+                value = self._orbit[self._index[pvname]]
+
+            elif pvname in self._shading_index:
+                value = self._shading[self._shading_index[pvname]]
+
+            else:
+                return None
+
+        return None if np.isnan(value) else float(value)
+
+    def values(self) -> Dict[str, float]:
+        """Current values of all PVs, NaN for dropped readings.
+
+        """
+        self.advance()
+
+        with self._lock:
+            values = dict(zip(self._index, self._orbit.ravel().tolist()))
+            values.update(zip(self.shading_pvs, self._shading.tolist()))
+
+        return values
+
+
+class SimulatedController:
+    """In-process stand-in for a lume-epics Controller serving the PVs of a
+    BPMSimulator, for use with OrbitAcquisition.
+
+    """
+
+    def __init__(self, simulator: BPMSimulator):
+        self.simulator = simulator
+
+    def get_value(self, pvname: str) -> Optional[float]:
+        return self.simulator.get_value(pvname)
+
+    def close(self) -> None:
+        pass
+
+
+def simulated_display(n_devices: int, seed: int = 0, dropout: float = 0.0, **kwargs) -> Tuple["OrbitDisplay", "Document"]:
+    """Build an OrbitDisplay of simulated BPMs attached to a new document holding
+    the widgets of the example application, e.g. for tests and benchmarks. Each
+    beamline has its own acquisition, whose readings only change when its
+    simulator is stepped.
+
+    Args:
+        n_devices (int): Number of BPMs per beamline.
+        seed (int): Seed of the simulators.
+        dropout (float): Probability of a reading being missing.
+        **kwargs: Arguments of OrbitDisplay overriding those of the example.
+
+    """
+    from bokeh.document import Document
+    from bokeh.layouts import column
+    from lume_model.variables import ScalarOutputVariable
+
+    from lcls_orbit import HXR_COLORS
+    from lcls_orbit.acquisition import OrbitAcquisition
+    from lcls_orbit.lattice import build_bpm_lattice
+    from lcls_orbit.widgets import OrbitDisplay
+
+    acquisitions = {}
+    for beamline in ("hxr", "sxr"):
+        devices = tuple(f"BPMS:{beamline.upper()}:{i}" for i in range(n_devices))
+        lattice = build_bpm_lattice(devices, tuple(np.linspace(2000.0, 3700.0, n_devices).tolist()))
+        simulator = BPMSimulator(
+            devices, shading_pvs=[f"{beamline}:SHADING"], dropout=dropout, update_rate=None, seed=seed
+        )
+        shading_var = ScalarOutputVariable(name=f"{beamline}:SHADING")
+        acquisitions[beamline] = OrbitAcquisition(lattice.table, SimulatedController(simulator), shading_var)
+
+    options = dict(
+        width=1024,
+        color_var=acquisitions["hxr"].shading_var,
+        color_map=HXR_COLORS,
+        extents=[0, 5],
+        bar_width=5,
+        acquisitions=acquisitions,
+    )
+    options.update(kwargs)
+
+    display = OrbitDisplay(
+        acquisitions["hxr"].table,
+        acquisitions["sxr"].table,
+        acquisitions["hxr"].shading_var,
+        acquisitions["sxr"].shading_var,
+        **options,
+    )
+
+    optional = [display.x_waterfall, display.y_waterfall, display.diagnostics]
+
+    doc = Document()
+    doc.add_root(
+        column(
+            display.beamline_selection_dropdown,
+            display.label,
+            display.compare_reference_dropdown,
+            display.reference_button,
+            display.save_reference_button,
+            display.reset_reference_button,
+            display.reference_tag_input,
+            display.rms_toggle,
+            display.x_plot,
+            display.y_plot,
+            *[model for model in optional if model is not None],
+        )
+    )
+
+    return display, doc
+
+
+def serve_soft_ioc(simulator: BPMSimulator, prefix: str = "", stop: threading.Event = None) -> None:
+    """Serve the PVs of a simulator over Channel Access from a soft IOC until stop is
+    set. Dropped readings are posted as NaN with an invalid alarm. Requires pcaspy.
+
+    """
+    from pcaspy import Alarm, Driver, Severity, SimpleServer
+
+    server = SimpleServer()
+    server.createPV(prefix, {pvname: {"type": "float", "prec": 4} for pvname in simulator.pvnames})
+    driver = Driver()
+
+    stop = threading.Event() if stop is None else stop
+    period = 0.01 if simulator.update_rate is None else 1 / simulator.update_rate
+    logger.info("Serving %s simulated PVs.", len(simulator.pvnames))
+
+    while not stop.is_set():
+        if simulator.advance():
+            for pvname, value in simulator.values().items():
+                driver.setParam(pvname, value)
+
+                if np.isnan(value):
+                    driver.setParamStatus(pvname, Alarm.COMM_ALARM, Severity.INVALID_ALARM)
+                else:
+                    driver.setParamStatus(pvname, Alarm.NO_ALARM, Severity.NO_ALARM)
+
+            driver.updatePVs()
+
+        server.process(period)
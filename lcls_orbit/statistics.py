@@ -0,0 +1,201 @@
+from typing import Tuple, Union
+import numpy as np
+
+
+def _as_samples(sample: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return a sample as float array with non-finite entries replaced by NaN, and
+    the mask of its finite entries.
+
+    """
+    sample = np.asarray(sample, dtype=np.float64)
+    valid = np.isfinite(sample)
+    return np.where(valid, sample, np.nan), valid
+
+
+class RunningStatistics:
+    """Streaming mean, variance, min and max of every element of a fixed shape array,
+    using Welford's algorithm. NaN samples are ignored element-wise, so each element
+    keeps its own sample count. Memory use is independent of the number of samples.
+
+    """
+
+    def __init__(self, shape: Union[int, Tuple[int, ...]]):
+        self.shape = (shape,) if isinstance(shape, int) else tuple(shape)
+        self.count = np.zeros(self.shape, dtype=np.int64)
+        self.mean = np.zeros(self.shape, dtype=np.float64)
+        self.min = np.full(self.shape, np.inf, dtype=np.float64)
+        self.max = np.full(self.shape, -np.inf, dtype=np.float64)
+        self._m2 = np.zeros(self.shape, dtype=np.float64)
+
+    def reset(self) -> None:
+        self.count.fill(0)
+        self.mean.fill(0)
+        self.min.fill(np.inf)
+        self.max.fill(-np.inf)
+        self._m2.fill(0)
+
+    def update(self, sample: np.ndarray) -> None:
+        """Add a sample of the accumulator's shape.
+
+        """
+        sample, valid = _as_samples(sample)
+        self.count += valid
+
+        delta = np.where(valid, sample - self.mean, 0)
+        self.mean += np.divide(delta, self.count, out=np.zeros(self.shape), where=valid)
+        self._m2 += np.where(valid, delta * (sample - self.mean), 0)
+
+        np.fmin(self.min, sample, out=self.min)
+        np.fmax(self.max, sample, out=self.max)
+
+    @property
+    def variance(self) -> np.ndarray:
+        """Population variance, NaN for elements without samples.
+
+        """
+        return np.divide(self._m2, self.count, out=np.full(self.shape, np.nan), where=self.count > 0)
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.variance)
+
+
+class WindowedStatistics:
+    """Streaming mean and variance over the last window samples of every element of
+    a fixed shape array. Samples leaving the window are removed with Welford's
+    downdate, so an update costs O(size) regardless of the window length. Only the
+    samples inside the window are stored. NaN samples are ignored element-wise.
+
+    """
+
+    def __init__(self, shape: Union[int, Tuple[int, ...]], window: int):
+        self.shape = (shape,) if isinstance(shape, int) else tuple(shape)
+        self.window = window
+        self.count = np.zeros(self.shape, dtype=np.int64)
+        self.mean = np.zeros(self.shape, dtype=np.float64)
+        self._m2 = np.zeros(self.shape, dtype=np.float64)
+        self._samples = np.full((window,) + self.shape, np.nan, dtype=np.float64)
+        self._index = 0
+
+    def reset(self) -> None:
+        self.count.fill(0)
+        self.mean.fill(0)
+        self._m2.fill(0)
+        self._samples.fill(np.nan)
+        self._index = 0
+
+    def update(self, sample: np.ndarray) -> None:
+        """Add a sample of the accumulator's shape, dropping the oldest sample once the
+        window is full.
+
+        """
+        old = self._samples[self._index]
+
+        # downdate with the sample leaving the window
+        leaving = np.isfinite(old)
+        self.count -= leaving
+        delta = np.where(leaving, old - self.mean, 0)
+        self.mean -= np.divide(delta, self.count, out=np.zeros(self.shape), where=leaving & (self.count > 0))
+        self._m2 -= np.where(leaving, delta * (old - self.mean), 0)
+
+        # elements without samples restart from zero to avoid accumulating rounding errors
+        empty = self.count == 0
+        self.mean[empty] = 0
+        self._m2[empty] = 0
+
+        # update with the new sample
+        sample, entering = _as_samples(sample)
+        self.count += entering
+        delta = np.where(entering, sample - self.mean, 0)
+        self.mean += np.divide(delta, self.count, out=np.zeros(self.shape), where=entering)
+        self._m2 += np.where(entering, delta * (sample - self.mean), 0)
+        np.maximum(self._m2, 0, out=self._m2)
+
+        self._samples[self._index] = sample
+        self._index = (self._index + 1) % self.window
+
+    @property
+    def variance(self) -> np.ndarray:
+        """Population variance over the window, NaN for elements without samples.
+
+        """
+        return np.divide(self._m2, self.count, out=np.full(self.shape, np.nan), where=self.count > 0)
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.variance)
+
+    @property
+    def min(self) -> np.ndarray:
+        """Minimum over the window. Computed on access from the stored samples.
+
+        """
+        return np.fmin.reduce(self._samples, axis=0)
+
+    @property
+    def max(self) -> np.ndarray:
+        """Maximum over the window. Computed on access from the stored samples.
+
+        """
+        return np.fmax.reduce(self._samples, axis=0)
+
+
+class ExponentialStatistics:
+    """Exponentially weighted mean and variance of every element of a fixed shape
+    array. Recent samples are weighted by alpha, so the statistics follow the last
+    ~1/alpha samples without storing any of them. Min and max decay towards the
+    mean with the same weight. NaN samples are ignored element-wise.
+
+    """
+
+    def __init__(self, shape: Union[int, Tuple[int, ...]], alpha: float = 0.05):
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be in (0, 1].")
+
+        self.shape = (shape,) if isinstance(shape, int) else tuple(shape)
+        self.alpha = alpha
+        self.count = np.zeros(self.shape, dtype=np.int64)
+        self.mean = np.zeros(self.shape, dtype=np.float64)
+        self.min = np.full(self.shape, np.nan, dtype=np.float64)
+        self.max = np.full(self.shape, np.nan, dtype=np.float64)
+        self._variance = np.zeros(self.shape, dtype=np.float64)
+
+    def reset(self) -> None:
+        self.count.fill(0)
+        self.mean.fill(0)
+        self.min.fill(np.nan)
+        self.max.fill(np.nan)
+        self._variance.fill(0)
+
+    def update(self, sample: np.ndarray) -> None:
+        """Add a sample of the accumulator's shape.
+
+        """
+        sample, valid = _as_samples(sample)
+        first = valid & (self.count == 0)
+        self.count += valid
+
+        delta = np.where(valid, sample - self.mean, 0)
+        delta[first] = 0
+        self.mean[first] = sample[first]
+
+        increment = self.alpha * delta
+        self.mean += increment
+        self._variance = np.where(valid, (1 - self.alpha) * (self._variance + delta * increment), self._variance)
+
+        # extrema decay towards the mean so old excursions are forgotten
+        decayed_min = self.min + self.alpha * (self.mean - self.min)
+        decayed_max = self.max + self.alpha * (self.mean - self.max)
+        self.min = np.where(valid, np.fmin(decayed_min, sample), self.min)
+        self.max = np.where(valid, np.fmax(decayed_max, sample), self.max)
+
+    @property
+    def variance(self) -> np.ndarray:
+        """Exponentially weighted variance, NaN for elements without samples.
+
+        """
+        return np.where(self.count > 0, self._variance, np.nan)
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.variance)
@@ -1,21 +1,128 @@
 from typing import List, Dict
 import logging
+import threading
 import numpy as np
-from datetime import datetime
+import time
 
+from bokeh.document import Document
 from bokeh.plotting import figure
-from bokeh.models import ColumnDataSource, Span, Button, ColorBar, LinearColorMapper, Dropdown, LinearAxis, HoverTool, Div
+from bokeh.models import ColumnDataSource, Span, BoxAnnotation, Button, ColorBar, LinearColorMapper, Dropdown, LinearAxis, HoverTool, Div, Toggle, TextInput, CustomJS
+from bokeh.models.annotations import Annotation
+from bokeh.palettes import RdBu11
+from bokeh.transform import dodge, transform
 
 from lume_model.variables import TableVariable, ScalarVariable
 from lume_epics.client.controller import (
     Controller
 )
-from lume_epics.client.monitors import PVTable, PVScalar
+from lume_epics.client.monitors import PVScalar
 
-from lcls_orbit import SXR_COLORS, HXR_COLORS, SXR_AREAS, HXR_AREAS
+from lcls_orbit import SXR_COLORS, HXR_COLORS, SXR_AREAS, HXR_AREAS, SXR_AREA_EXTENTS, HXR_AREA_EXTENTS
+from lcls_orbit.acquisition import PLANES, OrbitAcquisition, OrbitSnapshot, replace_acquisition
+from lcls_orbit.collector import ReferenceCollector
+from lcls_orbit.colors import COLOR_SOURCES, ColorScale
+from lcls_orbit.history import OrbitHistory
+from lcls_orbit.metrics import UpdateMetrics
+from lcls_orbit.references import Reference, ReferenceStore, zero_reference
 
 logger = logging.getLogger(__name__)
 
+# bar color used when no shading value is available
+DEFAULT_COLOR = "#695f5e"
+
+# outline color of the RMS overlay bars
+RMS_COLOR = "#f08a24"
+
+# diverging palette of the waterfall plots, negative values blue
+WATERFALL_COLORS = tuple(reversed(RdBu11))
+
+# browser side copy of the newest shot of a waterfall source into its ring row of
+# the image, which is then drawn at 0
+WATERFALL_ROW_JS = """
+const data = cb_obj.data
+const row = data.row[0]
+data.image[0].set(row, data.index[0] * row.length)
+data.y = [-data.index[0] - 0.5]
+cb_obj.change.emit()
+"""
+
+# period in seconds of the refreshes of the diagnostics div
+DIAGNOSTICS_PERIOD = 1.0
+
+# period in seconds of the refreshes of the stored references listed in the
+# reference dropdown, which other sessions may add to
+REFERENCES_PERIOD = 5.0
+
+
+class PlotAnnotations:
+    """Owner of the persistent annotations drawn on a plot. Annotations are added
+    to the plot once, grouped by name, and afterwards only shown or hidden so the
+    number of models in the document stays constant.
+
+    """
+
+    def __init__(self, plot):
+        self._plot = plot
+        self._groups = {}
+        self._visible = {}
+
+    def add(self, group: str, annotation: Annotation, place: str = "center") -> Annotation:
+        """Add an annotation to the plot under a group. Groups start hidden.
+
+        """
+        annotation.visible = self._visible.setdefault(group, False)
+        self._groups.setdefault(group, []).append(annotation)
+        self._plot.add_layout(annotation, place)
+        return annotation
+
+    def set_visible(self, group: str, visible: bool) -> None:
+        """Show or hide all annotations of a group. Only emits property changes if
+        the visibility of the group actually changes.
+
+        """
+        visible = bool(visible)
+        if self._visible.get(group) == visible:
+            return
+
+        self._visible[group] = visible
+        for annotation in self._groups[group]:
+            annotation.visible = visible
+
+
+class BeamlineState:
+    """Display state of one beamline. Takes the fixed device slot index of an
+    acquisition and allocates the orbit and validity arrays, where row ``i``
+    corresponds to ``PLANES[i]`` and column ``j`` to ``devices[j]``. A display
+    holds one state per beamline and switches between them by reference, so
+    attributes may be modified in place or reassigned alike.
+
+    """
+
+    def __init__(self, acquisition: OrbitAcquisition, dtype: np.dtype, history_n: int = None):
+        """
+        Args:
+            acquisition (OrbitAcquisition): Acquisition of the beamline.
+            dtype (np.dtype): dtype of the numeric columns sent to the browser.
+            history_n (int): Number of shots kept for the waterfall plots, None
+                disables the history.
+
+        """
+        devices = acquisition.devices
+        shape = (len(PLANES), len(devices))
+
+        self.acquisition = acquisition
+        self.devices = devices
+        self.device_index = {device: i for i, device in enumerate(devices)}
+        self.z = acquisition.z
+        self.z_column = acquisition.z.astype(dtype)
+        self.device_column = list(devices)
+        self.orbit = np.full(shape, np.nan, dtype=np.float64)
+        self.valid = np.zeros(shape, dtype=bool)
+        self.history = None if history_n is None else OrbitHistory(len(devices), history_n)
+
+        # immutable, replaced as a whole, see OrbitDisplay._swap_reference
+        self.active_reference = zero_reference(devices)
+
 
 class OrbitDisplay:
     """Object holding orbit display widgets.
@@ -28,7 +135,7 @@ class OrbitDisplay:
         sxr_table: TableVariable,
         hxr_shading_var: ScalarVariable,
         sxr_shading_var: ScalarVariable, 
-        controller: Controller,
+        controller: Controller = None,
         height: int = 400,
         width: int = 600,
         bar_width: int = None,
@@ -37,55 +144,111 @@ class OrbitDisplay:
         extents: list = None,
         reference_n: int = 15,
         active_beamline: str = "hxr",
+        patch_fraction: float = 0.5,
+        dtype: type = np.float64,
+        acquisitions: Dict[str, OrbitAcquisition] = None,
+        show_rms: bool = False,
+        history_n: int = None,
+        waterfall_extents: list = (-1, 1),
+        diagnostics: bool = False,
+        reference_store: ReferenceStore = None,
+        color_by: str = "shading",
     ):
 
-        # construct z
-        self._z = []
         self._active_beamline = active_beamline
 
+        # how many samples per device a reference is collected from
+        self._reference_n = reference_n
+
         self._sxr_table = sxr_table
         self._hxr_table = hxr_table
         self._sxr_shading_var = sxr_shading_var
         self._hxr_shading_var = hxr_shading_var
 
-        if self._active_beamline == "sxr":
-            table = self._sxr_table
+        # per beamline orbit acquisitions, either shared with other displays or
+        # private to this one
+        if acquisitions is None:
+            shading_vars = {"hxr": hxr_shading_var, "sxr": sxr_shading_var}
+            if color_var is not None:
+                shading_vars[active_beamline] = color_var
+
+            acquisitions = {
+                "hxr": OrbitAcquisition(hxr_table, controller, shading_vars["hxr"]),
+                "sxr": OrbitAcquisition(sxr_table, controller, shading_vars["sxr"]),
+            }
 
-        elif self._active_beamline == "hxr": 
-            table = self._hxr_table
+        # dtype of the numeric columns sent to the browser
+        self._dtype = np.dtype(dtype)
 
-        for row, value in table.table_data["Z"].items():
-            self._z.append(value)
+        # number of shots kept per beamline for the waterfall plots, None disables
+        # the history
+        self._history_n = history_n
 
-        self._monitor = PVTable(table, controller)
-        self._controller = controller
+        # phase timings and counters of update
+        self.metrics = UpdateMetrics()
 
+        # display state of each beamline, kept warm so toggling only swaps it
+        self._acquisitions = acquisitions
+        self._states = {}
+        self._activate(active_beamline)
 
         # validate color inputs
+        self._shading = color_var is not None
+        self._color_map = [DEFAULT_COLOR]
         if color_var is not None:
-            self._color_monitor = PVScalar(color_var, controller)
             if extents is None:
                 raise ValueError("Color map requires passing of extents.")
-            else:
-                self._extents = np.array(extents)
 
             if color_map is None:
                 raise ValueError("Color map not provided.")
             else:
                 self._color_map = color_map
 
+        if color_by not in COLOR_SOURCES:
+            raise ValueError(f"Unknown color source {color_by}.")
+
+        # shading PV chosen by this display, read by the display itself unless it
+        # is the PV of the acquisition, which may be shared with other sessions
+        self._shading_var = None
+        self._shading_monitor = None
+        if color_var is not None:
+            self._set_shading_var(color_var)
+
+        # bars are colored client side from the palette indices of the color column,
+        # missing values fall back to the default gray
+        self._color_by = color_by
+        self._color_scale = ColorScale(self._color_map, *(extents if extents is not None else (0, 1)))
+        self._color_mapper = self._color_scale.mapper(nan_color=DEFAULT_COLOR)
+
         if not bar_width:
-            self._bar_width = (max(self._z) - min(self._z)) / (len(self._z) + 1)
+            self._bar_width = (self._state.z.max() - self._state.z.min()) / (len(self._state.z) + 1)
         else:
             self._bar_width = bar_width
 
-        self._x_source = ColumnDataSource(dict(x=[], y=[], device=[], color=[]))
-        self._y_source = ColumnDataSource(dict(x=[], y=[], device=[], color=[]))
+        # one source backs the bars of both planes, so the columns they share are
+        # sent once
+        self._source = ColumnDataSource(dict(z=[], x=[], y=[], device=[], color=[], rms_x=[], rms_y=[]))
+
+        # columns last pushed to the source, used to send deltas only. Columns are
+        # patched if at most patch_fraction of their entries changed and replaced
+        # otherwise
+        self._pushed = {}
+        self._patch_fraction = patch_fraction
+
+        # document snapshots are applied to when connected, and the newest snapshot
+        # waiting for the next tick of that document
+        self._doc = None
+        self._pending = None
+        self._pending_lock = threading.Lock()
+
+        # document the periodic refresh callbacks were added to
+        self._refresh_doc = None
 
         tooltips_x = [
             ("device", "@device"),
-            ("value", "@y"),
-            ("location", "@x{0.0}")
+            ("value", "@x"),
+            ("rms", "@rms_x"),
+            ("location", "@z{0.0}")
         ]
         
         x_hover = HoverTool(tooltips=tooltips_x)
@@ -93,13 +256,13 @@ class OrbitDisplay:
         # set up x plot
         self.x_plot = figure(
             y_range=(-1, 1),
-            x_range=(min(self._z) - self._bar_width / 2.0, max(self._z) + self._bar_width / 2.0),
+            x_range=(self._state.z.min() - self._bar_width / 2.0, self._state.z.max() + self._bar_width / 2.0),
             width=width,
             height=height,
             toolbar_location="right",
             title="X (mm)",
         )
-        self.x_plot.vbar(x="x", bottom=0, top="y", width=self._bar_width, source=self._x_source,  color="color")
+        x_bars = self.x_plot.vbar(x="z", bottom=0, top="x", width=self._bar_width, source=self._source, color=transform("color", self._color_mapper))
         self.x_plot.add_tools(x_hover)
         self.x_plot.xgrid.grid_line_color = None
         self.x_plot.ygrid.grid_line_color = None
@@ -115,7 +278,8 @@ class OrbitDisplay:
         tooltips_y = [
             ("device", "@device"),
             ("value", "@y"),
-            ("location", "@x{0.0}")
+            ("rms", "@rms_y"),
+            ("location", "@z{0.0}")
         ]
 
         y_hover = HoverTool(tooltips=tooltips_y)
@@ -128,7 +292,7 @@ class OrbitDisplay:
             toolbar_location="right",
             title="Y (mm)",
         )
-        self.y_plot.vbar(x="x", bottom=0, top="y", width=self._bar_width, source=self._y_source, color="color")
+        y_bars = self.y_plot.vbar(x="z", bottom=0, top="y", width=self._bar_width, source=self._source, color=transform("color", self._color_mapper))
         self.y_plot.add_tools(y_hover)
         self.y_plot.xgrid.grid_line_color = None
         self.y_plot.ygrid.grid_line_color = None
@@ -140,17 +304,73 @@ class OrbitDisplay:
         self.y_plot.xaxis.axis_label = "z (m)"
         self.y_plot.outline_line_color = None
 
-        # track devices 
-        self._devices = table.rows
+        # outlined bars of the orbit jitter, hover only reports the orbit bars
+        self._rms_renderers = [
+            plot.vbar(
+                x="z", bottom=0, top=f"rms_{plane}", width=self._bar_width, source=self._source,
+                fill_alpha=0, line_color=RMS_COLOR, line_width=1, visible=show_rms,
+            )
+            for plot, plane in ((self.x_plot, "x"), (self.y_plot, "y"))
+        ]
+        x_hover.renderers = [x_bars]
+        y_hover.renderers = [y_bars]
+
+        self.rms_toggle = Toggle(label="Show RMS", active=show_rms)
+        self.rms_toggle.on_change("active", self._rms_toggle_callback)
+
+        # waterfall plots of the displayed orbit, one image per plane with a row
+        # per shot and a column per device, newest shot on top. The image is the
+        # history ring, drawn twice one capacity apart and moved so the newest row
+        # is at 0, so a tick only sends the newest row and the offset
+        self.x_waterfall = None
+        self.y_waterfall = None
+        self._waterfall_sources = []
+        self._waterfall_devices = None
+
+        if history_n is not None:
+            waterfall_mapper = LinearColorMapper(
+                palette=WATERFALL_COLORS, low=waterfall_extents[0], high=waterfall_extents[1], nan_color="#ffffff"
+            )
+
+            waterfalls = []
+            for plane in PLANES:
+                # the newest shot and its ring row are copied into the image by the
+                # browser, so a shot is sent as one binary array
+                source = ColumnDataSource(dict(image=[], x=[], y=[], dw=[], dh=[], row=[], index=[]))
+                source.js_on_change("data", CustomJS(code=WATERFALL_ROW_JS))
+                waterfall = figure(
+                    width=width,
+                    height=height // 2,
+                    y_range=(-history_n + 0.5, 0.5),
+                    toolbar_location="right",
+                    title=f"{plane} history (mm)",
+                    tooltips=[("shot", "$y{0}"), ("value", "@image")],
+                )
+                for y in ("y", dodge("y", -history_n)):
+                    waterfall.image(
+                        image="image", x="x", y=y, dw="dw", dh="dh", source=source, color_mapper=waterfall_mapper
+                    )
+                waterfall.xaxis.axis_label = "BPM"
+                waterfall.yaxis.axis_label = "shot (0 = latest)"
+                waterfall.xgrid.grid_line_color = None
+                waterfall.ygrid.grid_line_color = None
+                waterfall.outline_line_color = None
+
+                self._waterfall_sources.append(source)
+                waterfalls.append(waterfall)
+
+            self.x_waterfall, self.y_waterfall = waterfalls
+            self.x_waterfall.add_layout(ColorBar(color_mapper=waterfall_mapper), "right")
+
+        # optional on-page table of the update metrics
+        self.diagnostics = Div(text="", style={"font-size": "80%"}) if diagnostics else None
 
         # indicator whether collecting reference
         self._collecting_reference = False
+        self._reference_collector = None
 
-        # store reference
-        self._reference_measurements = {"X": {device: [] for device in self._devices}, "Y": {device: [] for device in self._devices}}
-        self._active_reference = {"X": {device: 0 for device in self._devices}, "Y": {device: 0 for device in self._devices}}
-        self._active_reference_timestamp = None
-        self._reference_registry = {"sxr": {}, "hxr": {}}
+        # store saved references go to, private to this display unless passed
+        self._reference_store = ReferenceStore(":memory:") if reference_store is None else reference_store
         self._active_beamline = active_beamline
 
         self.label = Div(
@@ -167,10 +387,6 @@ class OrbitDisplay:
         self.beamline_selection_dropdown = Dropdown(label="Beamline", button_type="default", menu=menu)
         self.beamline_selection_dropdown.on_click(self._toggle_callback)
 
-        # how many reference steps to collect
-        self._reference_n = reference_n
-        self._reference_count = reference_n
-
         # reference button
         self.reference_button = Button(label="Collect Reference")
         self.reference_button.on_click(self._collect_reference)
@@ -183,9 +399,13 @@ class OrbitDisplay:
         self.reset_reference_button = Button(label="Reset")
         self.reset_reference_button.on_click(self._reset_reference)
 
+        # tag stored with saved references
+        self.reference_tag_input = TextInput(placeholder="Reference tag")
+
         # reset button
         self.compare_reference_dropdown = Dropdown(label="Set Reference", menu=[])
         self.compare_reference_dropdown.on_click(self._set_reference)
+        self.refresh_references()
 
         # add color bars
         sxr_color_mapper = LinearColorMapper(palette=SXR_COLORS, low=extents[0], high=extents[1])
@@ -203,17 +423,77 @@ class OrbitDisplay:
         self._location_axis = LinearAxis(x_range_name="locations")
         self._location_axis.major_label_orientation = "vertical"
 
+        self._sxr_area_ticks = list(SXR_AREAS.keys())
+        self._hxr_area_ticks = list(HXR_AREAS.keys())
+
         if self._active_beamline == "sxr":
-            self._location_axis.ticker = list(SXR_AREAS.keys())
+            self._location_axis.ticker = self._sxr_area_ticks
             self._location_axis.major_label_overrides = SXR_AREAS
 
         elif self._active_beamline == "hxr":
-            self._location_axis.ticker = list(HXR_AREAS.keys())
+            self._location_axis.ticker = self._hxr_area_ticks
             self._location_axis.major_label_overrides = HXR_AREAS
 
         self.x_plot.add_layout(self._location_axis, 'above')
 
+        # persistent annotations
+        self._annotations = [PlotAnnotations(self.x_plot), PlotAnnotations(self.y_plot)]
+        for annotations in self._annotations:
+            annotations.add(
+                "zero", Span(location=0, dimension="width", line_color="black", line_width=2)
+            )
+            annotations.add("reference", BoxAnnotation(fill_color="#3881e8", fill_alpha=0.08))
+
+            for beamline, area_extents in (("hxr", HXR_AREA_EXTENTS), ("sxr", SXR_AREA_EXTENTS)):
+                for start, _ in area_extents.values():
+                    annotations.add(
+                        f"{beamline}_areas",
+                        Span(location=start, dimension="height", line_color="#b0b0b0", line_dash="dashed", line_width=1),
+                    )
+
+            annotations.set_visible(f"{self._active_beamline}_areas", True)
+
     
+    def stats(self) -> Dict[str, dict]:
+        """Counters, and the number of samples, mean, p50, p99 and max in ms of every
+        phase of update.
+
+        """
+        return self.metrics.stats()
+
+    @property
+    def acquisition(self) -> OrbitAcquisition:
+        """Acquisition of the active beamline.
+
+        """
+        return self._state.acquisition
+
+    def has_changed(self, snapshot: OrbitSnapshot, deadband: float = 0.0) -> bool:
+        """Whether drawing a snapshot would change the display, ignoring orbit
+        changes of at most deadband. Always True while collecting a reference, so the
+        progress is shown every tick.
+
+        """
+        if snapshot.devices is not self._state.devices:
+            return False
+
+        if self._collecting_reference or self._sequence is None:
+            return True
+
+        if snapshot.sequence == self._sequence:
+            return False
+
+        invalid = np.isnan(snapshot.orbit)
+        if not np.array_equal(invalid, ~self._state.valid):
+            return True
+
+        shading = self._shading_of(snapshot)
+        if shading != self._shading_value and not (np.isnan(shading) and np.isnan(self._shading_value)):
+            return True
+
+        valid = ~invalid
+        return bool(valid.any() and np.abs(snapshot.orbit[valid] - self._state.orbit[valid]).max() > deadband)
+
     def _toggle_callback(self, event):
         if event.item == "sxr":
             self.label.text="<b>SXR</b>"
@@ -228,173 +508,522 @@ class OrbitDisplay:
 
 
 
-    def update_table(self, table: dict) -> None:
-        """Assign new table variable.
-        
+    def _rms_toggle_callback(self, attr, old, new):
+        for renderer in self._rms_renderers:
+            renderer.visible = new
+
+    def update_table(self, table: TableVariable) -> None:
+        """Assign new table variable for the active beamline. The new acquisition is
+        of the kind of the replaced one, shared and started like it.
+
+        Raises:
+            ValueError: If the acquisition can not read another table, e.g. when
+                replaying a recording.
+
+        """
+        self._acquisitions[self._active_beamline] = replace_acquisition(
+            self._acquisitions[self._active_beamline], table
+        )
+        self._activate(self._active_beamline)
+
+        if self._shading_var is not None:
+            self._set_shading_var(self._shading_var)
+
+    def _activate(self, beamline: str) -> None:
+        """Back the plots with the display state of a beamline. The state is built
+        on first use, or when the beamline's acquisition was replaced, and reused
+        afterwards.
+
+        """
+        acquisition = self._acquisitions[beamline]
+        state = self._states.get(beamline)
+
+        if state is None or state.acquisition is not acquisition:
+            state = BeamlineState(acquisition, self._dtype, self._history_n)
+            self._states[beamline] = state
+
+        self._state = state
+
+        # sequence number and shading value of the snapshot held in the orbit array
+        self._sequence = None
+        self._shading_value = np.nan
+
+    def _read_orbit(self, snapshot: OrbitSnapshot) -> None:
+        """Copy a snapshot into the preallocated orbit array. Missing readings are
+        NaN and flagged in the validity mask. If the snapshot directly follows the
+        one already held, only the entries flagged as changed are copied.
+
+        """
+        if snapshot.changed is not None and self._sequence is not None and snapshot.sequence == self._sequence + 1:
+            np.copyto(self._state.orbit, snapshot.orbit, where=snapshot.changed)
+            np.isfinite(self._state.orbit, out=self._state.valid, where=snapshot.changed)
+
+        else:
+            np.copyto(self._state.orbit, snapshot.orbit)
+            np.isfinite(self._state.orbit, out=self._state.valid)
+
+        self._sequence = snapshot.sequence
+
+    def _refresh(self) -> None:
+        """Redraw the latest snapshot, e.g. after the reference changed while the
+        acquisition has nothing new to publish.
+
+        """
+        if self._state.acquisition.latest is not None:
+            self.update(self._state.acquisition.latest)
+
+
+    def add_refresh_callbacks(self, doc: Document) -> None:
+        """Refresh the widgets showing state other than the orbit from periodic
+        callbacks of a document, so they stay current while no orbit is drawn.
+        Called by connect and RenderScheduler.start, callbacks are only added once
+        per document.
+
+        """
+        if self._refresh_doc is doc:
+            return
+
+        self._refresh_doc = doc
+        doc.add_periodic_callback(self.refresh_references, REFERENCES_PERIOD * 1000)
+
+        if self.diagnostics is not None:
+            doc.add_periodic_callback(self.refresh_diagnostics, DIAGNOSTICS_PERIOD * 1000)
+
+    def refresh_diagnostics(self) -> None:
+        """Show the current update metrics in the diagnostics div, if enabled.
+
         """
-        self._monitor = PVTable(table, self._controller)
+        if self.diagnostics is not None:
+            self.diagnostics.text = self.metrics.to_html()
 
-        self._z = []
+    def connect(self, doc: Document) -> None:
+        """Apply the snapshots published by the acquisitions to a document as they
+        arrive, instead of polling from a periodic callback. Only the finished
+        snapshot is handed to the document's event loop, so polling latency does
+        not block it.
 
-        # caget_many
-        for row, value in table.table_data["Z"].items():
-            self._z.append(value)
+        """
+        self._doc = doc
+        self.add_refresh_callbacks(doc)
 
+        for acquisition in self._acquisitions.values():
+            acquisition.subscribe(self._on_snapshot)
 
-        self._reference_measurements = {"X": {row: [] for row in table.rows}, "Y": {row: [] for row in table.rows}}
-        self._devices =  table.rows
-        self._active_reference = {"X": {device: 0 for device in self._devices}, "Y": {device: 0 for device in self._devices}}
+        doc.on_session_destroyed(lambda session_context: self.disconnect())
 
+    def disconnect(self) -> None:
+        """Stop receiving snapshots from the acquisitions and cancel a running
+        reference collection.
 
-    def update(self) -> None:
+        """
+        for acquisition in self._acquisitions.values():
+            acquisition.unsubscribe(self._on_snapshot)
+
+        if self._reference_collector is not None:
+            self._reference_collector.cancel()
+
+        self._doc = None
+
+    def _on_snapshot(self, snapshot: OrbitSnapshot) -> None:
+        # runs in the polling thread, only schedules a single pending update
+        # carrying the newest snapshot
+        doc = self._doc
+        if doc is None or snapshot.devices is not self._state.devices:
+            return
+
+        with self._pending_lock:
+            scheduled = self._pending is not None
+            self._pending = snapshot
+
+        if not scheduled:
+            doc.add_next_tick_callback(self._apply_pending)
+
+    def _apply_pending(self) -> None:
+        with self._pending_lock:
+            snapshot, self._pending = self._pending, None
+
+        if snapshot is not None:
+            self.update(snapshot)
+
+    def update(self, snapshot: OrbitSnapshot = None) -> None:
         """
         Callback which updates the plot to reflect updated process variable values or
-        new process variable.
+        new process variable. Uses the latest snapshot of the active acquisition if
+        no snapshot is passed.
 
         """
-        vals = self._monitor.poll()
+        timer = self.metrics.timer()
 
+        if snapshot is None:
+            snapshot = self._state.acquisition.snapshot()
+            timer.lap("poll")
 
-        if self._color_monitor is not None:
-            color_val = self._color_monitor.poll()
-            idx = (np.abs(self._extents - color_val)).argmin()
-            color = self._color_map[idx]
-            colors = [color for device in vals["X"]]
+        # skip snapshots of a beamline that is no longer active
+        elif snapshot.devices is not self._state.devices:
+            self.metrics.count("stale")
+            return
 
+        self._read_orbit(snapshot)
+        self.metrics.count("missing", self._state.valid.size - np.count_nonzero(self._state.valid))
+        timer.lap("read")
+
+        self._shading_value = self._shading_of(snapshot)
+
+        # jitter is independent of the reference, NaN where not tracked
+        if snapshot.jitter is None:
+            rms = np.full((len(PLANES), len(self._state.devices)), np.nan, dtype=self._dtype)
         else:
-            # use default gray color
-            colors = ["#695f5e" for device in vals["X"] ]
+            # copied, the snapshot's array is read-only and columns are patched in place
+            rms = np.array(snapshot.jitter, dtype=self._dtype)
+
+        # references are collected in the background, only the progress is shown
+        collector = self._reference_collector
+        if collector is not None:
+            if collector.done:
+                self._finish_reference()
+            else:
+                self.reference_button.label = f"Collecting {collector.progress}/{self._reference_n}"
 
+        timer.lap("reference")
 
-        # if collecting reference, update values
-        if self._collecting_reference:
-            self._reference_count -= 1
+        # modify vals w.r.t. reference, invalid readings remain NaN
+        displayed = self._state.active_reference.orbit - self._state.orbit
+        x, y = displayed.astype(self._dtype, copy=False)
+        timer.lap("arrays")
 
-            for device in vals["X"]:
-                self._reference_measurements["X"][device].append(vals["X"][device])
-            
-            for device in vals["Y"]:
-                self._reference_measurements["Y"][device].append(vals["Y"][device])
+        colors = self._color_scale.encode(self._color_values(snapshot, displayed)).astype(self._dtype, copy=False)
+        timer.lap("color")
 
-            # check n remaining
-            if self._reference_count == 0:
-                self._collecting_reference=False
+        # show hline if 0 inside
+        for annotations, plane, valid in zip(self._annotations, (x, y), self._state.valid):
+            annotations.set_visible("zero", valid.any() and np.nanmin(plane) < 0 < np.nanmax(plane))
 
-                for device in self._devices:
-                    x_mean = np.mean([x for x in self._reference_measurements["X"][device] if x != None])
-                    y_mean = np.mean([y for y in self._reference_measurements["Y"][device] if y != None])
+        self._push(self._source, self._pushed, {"x": x, "y": y, "color": colors, "rms_x": rms[0], "rms_y": rms[1]})
+        timer.lap("push")
 
-                    if not np.isnan(x_mean):
-                        self._active_reference["X"][device] = x_mean
+        if self._state.history is not None:
+            self._state.history.append(displayed, snapshot.timestamp)
+            self._push_waterfall()
+            timer.lap("history")
 
-                    if not np.isnan(y_mean):
-                        self._active_reference["Y"][device] = y_mean
+        self.metrics.count("ticks")
 
-                # reset
-                for device in self._reference_measurements["X"]:
-                    self._reference_measurements["X"][device] = []
-                
-                for device in self._reference_measurements["Y"]:
-                    self._reference_measurements["Y"][device] = []
+    def _push_waterfall(self) -> None:
+        """Send the newest shot of the history of the active beamline as one float32
+        row per plane, transferred as a binary buffer. The browser copies the row
+        into the ring row of the waterfall image and moves the image so the row is
+        drawn at 0, see WATERFALL_ROW_JS. The whole history ring is only sent when
+        the devices change, as one float32 array per plane.
 
+        """
+        history = self._state.history
+        newest = history.newest
+        y = -newest - 0.5
+        rows = history.ring_row(newest)
+
+        if self._waterfall_devices is not self._state.devices:
+            for source, image, row in zip(self._waterfall_sources, history.ring(), rows):
+                source.data = dict(
+                    image=[image],
+                    x=[-0.5],
+                    y=np.array([y]),
+                    dw=[len(self._state.devices)],
+                    dh=[history.capacity],
+                    row=[row],
+                    index=[newest],
+                )
+                self.metrics.count("bytes_pushed", image.nbytes)
+
+            self._waterfall_devices = self._state.devices
+            return
+
+        for source, row in zip(self._waterfall_sources, rows):
+            # the image and offset of the server are updated in place, which sends
+            # nothing, so they match the browser's copy
+            source.data["image"][0][newest] = row
+            source.data["y"][0] = y
+
+            source.data.update(row=[row], index=[newest])
+            self.metrics.count("bytes_pushed", row.nbytes)
+
+    def _push(self, source: ColumnDataSource, pushed: Dict[str, np.ndarray], columns: Dict[str, np.ndarray]) -> None:
+        """Send changed columns to a source. The full data is only replaced when the
+        devices backing the source change, otherwise each column is either patched
+        with its changed entries or replaced as a whole depending on the fraction of
+        entries that changed. Patches hold one slice per run of consecutive changed
+        entries with a NumPy array of their values, which Bokeh sends with NaN
+        unlike Python floats.
 
-                # reset button
-                self.reference_button.label = "Collect reference"
-                self.reference_button.disabled = False
-                self._reference_count = 0
+        """
+        state = self._state
+        if pushed.get("device") is not state.devices:
+            pushed.clear()
+            pushed.update(columns, device=state.devices)
+            source.data = dict(z=state.z_column, device=state.device_column, **columns)
+            self.metrics.count(
+                "bytes_pushed",
+                state.z_column.nbytes + sum(map(len, state.device_column)) + sum(value.nbytes for value in columns.values()),
+            )
+            return
 
-                # reset
-                self._reference_count = self._reference_n
+        patches = {}
+        replaced = {}
 
+        for name, value in columns.items():
+            previous = pushed[name]
+            changed = value != previous
 
-        # modify vals w.r.t. reference
-        for device in vals["X"]:
-            if vals["X"][device] is not None:
-                vals["X"][device] = self._active_reference["X"][device] - vals["X"][device]
-        for device in vals["Y"]:
-            if vals["Y"][device] is not None:
-                vals["Y"][device] = self._active_reference["Y"][device] - vals["Y"][device]
+            # NaN never compares equal, but an unchanged missing reading is not a change
+            if value.dtype.kind == "f":
+                changed &= ~(np.isnan(value) & np.isnan(previous))
 
+            n_changed = np.count_nonzero(changed)
+            if not n_changed:
+                continue
 
-        devices = [device for device in vals['X']]
-        x = np.array([vals["X"][device] for device in vals["X"]], dtype=np.float64)
-        y = np.array([vals["Y"][device] for device in vals["Y"]], dtype=np.float64)
+            pushed[name] = value
+            idx = np.flatnonzero(changed)
 
-        # add hline if 0 inside
-        if min(x) < 0 < max(x):
-            hline = Span(
-                location=0, dimension="width", line_color="black", line_width=2
-            )
-            self.x_plot.add_layout(hline)
+            if n_changed > self._patch_fraction * len(value):
+                replaced[name] = value
+                self.metrics.count("bytes_pushed", value.nbytes)
 
+            else:
+                breaks = np.flatnonzero(np.diff(idx) != 1) + 1
+                starts = idx[np.concatenate(([0], breaks))].tolist()
+                stops = (idx[np.concatenate((breaks - 1, [len(idx) - 1]))] + 1).tolist()
+                patches[name] = [(slice(start, stop), value[start:stop]) for start, stop in zip(starts, stops)]
+                self.metrics.count("bytes_pushed", n_changed * value.itemsize + len(starts) * 2 * idx.itemsize)
 
-        # add hline if 0 inside
-        if min(y) < 0 < max(y):
-            hline = Span(
-                location=0, dimension="width", line_color="black", line_width=2
-            )
-            self.y_plot.add_layout(hline)
+        if replaced:
+            source.data.update(replaced)
+
+        if patches:
+            source.patch(patches)
+
+    def _color_values(self, snapshot: OrbitSnapshot, displayed: np.ndarray) -> np.ndarray:
+        """Per device values of the color source, NaN where unavailable. Quantities
+        measured per plane are combined as the length of the (X, Y) vector.
+
+        """
+        if self._color_by == "jitter":
+            if snapshot.jitter is None:
+                return np.full(len(self._state.devices), np.nan)
+
+            return np.hypot(*snapshot.jitter)
+
+        if self._color_by == "deviation":
+            return np.hypot(*displayed)
 
-        self._x_source.data.update({"x": self._z, "y": x, "device": devices, "color": colors})
-        self._y_source.data.update({"x": self._z, "y": y, "device": devices, "color": colors})
+        # shading value broadcast over all bars
+        return np.full(len(self._state.devices), self._shading_value if self._shading else np.nan)
 
     def update_colormap(self, color_var: ScalarVariable, cmap: list, extents: list):
         """Update colormap and assign new PV to track for color intensity. The plots will use 
         extents passed to evaluate the PV value along a continuum and assign a color.
+        The colormap only applies while coloring by shading.
         
         """
+        self._set_shading_var(color_var)
+
+        if self._color_by == "shading":
+            self._set_color_scale(cmap, extents)
+
+    def _set_shading_var(self, shading_var: ScalarVariable) -> None:
+        """Track a shading PV in this display only. The acquisition's own shading PV
+        is taken from its snapshots, other PVs are read through its controller, so
+        the choice does not change the acquisition shared with other sessions.
+        Acquisitions without a controller, e.g. monitored or replayed ones, supply
+        the shading of their snapshots regardless.
+
+        """
+        self._shading_var = shading_var
+        self._shading_monitor = None
+        self._shading = True
+
+        acquisition = self._state.acquisition
+        if acquisition.shading_var is not None and acquisition.shading_var.name == shading_var.name:
+            return
+
+        if acquisition.controller is None:
+            if acquisition.shading_var is not None:
+                logger.warning(
+                    "Unable to read shading PV %s without a controller, showing %s.",
+                    shading_var.name,
+                    acquisition.shading_var.name,
+                )
+
+            return
+
+        self._shading_monitor = PVScalar(shading_var, acquisition.controller)
+
+    def _shading_of(self, snapshot: OrbitSnapshot) -> float:
+        """Value of the shading PV of this display at a snapshot, NaN if unavailable.
+
+        """
+        if self._shading_monitor is None:
+            return snapshot.shading
+
+        try:
+            value = self._shading_monitor.poll()
+
+        except Exception:
+            logger.exception("Unable to read shading PV %s.", self._shading_var.name)
+            return np.nan
+
+        return np.nan if value is None else float(value)
+
+    def color_by(self, source: str, cmap: list = None, extents: list = None) -> None:
+        """Color the bars by the shading PV, the orbit jitter or the deviation from
+        the reference of each device.
+
+        Args:
+            source (str): One of COLOR_SOURCES.
+            cmap (list): Palette of the source, the current palette if None.
+            extents (list): Values mapped to the first and last color, the current
+                extents if None.
+
+        """
+        if source not in COLOR_SOURCES:
+            raise ValueError(f"Unknown color source {source}.")
+
+        self._color_by = source
+        self._set_color_scale(
+            self._color_map if cmap is None else cmap,
+            (self._color_scale.low, self._color_scale.high) if extents is None else extents,
+        )
+        self._refresh()
+
+    def _set_color_scale(self, cmap: list, extents: list) -> None:
         self._color_map = cmap
-        self._extents = np.array(range(extents[0], extents[1], len(self._color_map)))
-        self._color_monitor = PVScalar(color_var, self._controller)
+        self._color_scale.update(palette=cmap, low=extents[0], high=extents[1])
+        self._color_mapper.update(palette=list(cmap), high=len(cmap))
+
+        color_bar = self.sxr_color_bar if self._active_beamline == "sxr" else self.hxr_color_bar
+        color_bar.color_mapper.update(palette=list(cmap), low=extents[0], high=extents[1])
 
     def _collect_reference(self):
+        """Start collecting a reference of the active beamline at the rate of its
+        readings, restarting a running collection.
+
+        """
+        if self._reference_collector is not None:
+            self._reference_collector.cancel()
+
+        self._reference_collector = ReferenceCollector(self._state.acquisition, self._reference_n)
+        self._reference_collector.start(on_done=self._on_reference_collected)
+
         self._collecting_reference = True
-        self.reference_button.label = "Collecting"
+        self.reference_button.label = f"Collecting 0/{self._reference_n}"
         self.reference_button.disabled = True
-        self._active_reference_timestamp = datetime.now().strftime("%m/%d/%Y, %H:%M:%S")
+
+        for annotations in self._annotations:
+            annotations.set_visible("reference", True)
+
+    def _on_reference_collected(self, collector: ReferenceCollector) -> None:
+        # runs in the collection thread, a connected display shows the result right
+        # away instead of on the next snapshot
+        doc = self._doc
+        if doc is not None:
+            doc.add_next_tick_callback(self._refresh)
+
+    def _finish_reference(self) -> None:
+        """Activate the collected reference. Devices without a single valid reading
+        keep their old reference.
+
+        """
+        collector, self._reference_collector = self._reference_collector, None
+        self._collecting_reference = False
+
+        if collector.acquisition is self._state.acquisition:
+            self._swap_reference(collector.reference(fallback=self._state.active_reference))
+
+        self.reference_button.label = "Collect reference"
+        self.reference_button.disabled = False
+
+        for annotations in self._annotations:
+            annotations.set_visible("reference", False)
+
+    def _swap_reference(self, reference: Reference) -> None:
+        """Make reference the active reference of the active beamline. References
+        are immutable, so this swaps the object held by the beamline state without
+        copying any arrays.
+
+        """
+        self._state.active_reference = reference
 
     def _reset_reference(self):
-        self._active_reference = {"X": {device: 0 for device in self._devices}, "Y": {device: 0 for device in self._devices}}
-        self._active_reference_timestamp = None
+        self._swap_reference(zero_reference(self._state.devices))
+        self._refresh()
 
     def _save_reference(self):
-        self._reference_registry[self._active_beamline][self._active_reference_timestamp] = self._active_reference
-        self.compare_reference_dropdown.menu += [(self._active_reference_timestamp, self._active_reference_timestamp)]
-        self._active_reference_timestamp = None
+        self._swap_reference(
+            self._reference_store.save(
+                self._state.active_reference,
+                self._active_beamline,
+                timestamp=self._state.active_reference.metadata.get("timestamp"),
+                tag=self.reference_tag_input.value,
+            )
+        )
+        self.refresh_references()
 
     def _set_reference(self, event):
-        self._active_reference = self._reference_registry[self._active_beamline][event.item]
+        # devices missing from the stored reference are referenced to 0
+        reference = self._reference_store.load(int(event.item))
+        self._swap_reference(reference.aligned(self._state.devices, self._state.device_index))
+        self._refresh()
+
+    def refresh_references(self) -> None:
+        """List the stored references of the active beamline in the reference
+        dropdown, e.g. after another session saved one. The menu is only sent if it
+        changed.
+
+        """
+        try:
+            menu = [(info.label, str(info.id)) for info in self._reference_store.list(self._active_beamline)]
+
+        except Exception:
+            logger.exception("Unable to list stored references.")
+            return
+
+        if menu != self.compare_reference_dropdown.menu:
+            self.compare_reference_dropdown.menu = menu
 
     def toggle_beamline(self, beamline):
         self._active_beamline = beamline
+        self._activate(beamline)
 
         if beamline == "sxr":
-            self.update_table(self._sxr_table)
             self.update_colormap(self._sxr_shading_var, SXR_COLORS, extents = [0,5])
             self.hxr_color_bar.visible=False
             self.sxr_color_bar.visible=True
 
         elif beamline == "hxr":
-            self.update_table(self._hxr_table)
             self.update_colormap(self._hxr_shading_var, HXR_COLORS, extents = [0,5])
             self.hxr_color_bar.visible=True
             self.sxr_color_bar.visible=False
 
-        self.compare_reference_dropdown.menu = [registered for registered in self._reference_registry[beamline]]
+        # the color bar of the new beamline shows the scale of the other sources
+        if self._color_by != "shading":
+            self._set_color_scale(self._color_map, (self._color_scale.low, self._color_scale.high))
 
-        # reset
-        self._active_reference_timestamp = None
+        self.refresh_references()
 
-        for device in self._reference_measurements["X"]:
-            self._reference_measurements["X"][device] = []
-        
-        for device in self._reference_measurements["Y"]:
-            self._reference_measurements["Y"][device] = []
+        for annotations in self._annotations:
+            annotations.set_visible("hxr_areas", beamline == "hxr")
+            annotations.set_visible("sxr_areas", beamline == "sxr")
+            annotations.set_visible("reference", self._collecting_reference)
 
-        self.reference_button.label = "Collect reference"
-        self.reference_button.disabled = False
-        self._reference_count = 0
+        if beamline == "sxr":
+            self._location_axis.ticker = self._sxr_area_ticks
+            self._location_axis.major_label_overrides = SXR_AREAS
 
-        self._reference_count = self._reference_n
+        elif beamline == "hxr":
+            self._location_axis.ticker = self._hxr_area_ticks
+            self._location_axis.major_label_overrides = HXR_AREAS
 
+        # a running collection starts over on the new beamline
+        if self._collecting_reference:
+            self._collect_reference()
 
+        self._refresh()
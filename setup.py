@@ -27,6 +27,7 @@ setup(
     extras_require={
         "dev": dev_requirements,
         "test": ["pytest"],
+        "hdf5": ["h5py"],
     },
     url="https://github.com/slaclab/lcls-orbit",
     include_package_data=True,
@@ -0,0 +1,18 @@
+import pytest
+
+
+@pytest.fixture
+def make_display():
+    """Factory of OrbitDisplays backed by simulated BPMs, attached to a document.
+    Readings only change when the simulator of an acquisition is stepped.
+
+    """
+    pytest.importorskip("lume_model")
+    pytest.importorskip("lume_epics")
+
+    from lcls_orbit.simulation import simulated_display
+
+    def make(n_devices: int = 50, **kwargs):
+        return simulated_display(n_devices, width=800, **kwargs)
+
+    return make
@@ -0,0 +1,21 @@
+import numpy as np
+
+
+def test_jitter_ignores_unchanged_readings(make_display):
+    display, _ = make_display(n_devices=4)
+    acquisition = display.acquisition
+
+    rng = np.random.default_rng(0)
+    changed = np.zeros((2, 4), dtype=bool)
+    changed[:, 0] = True
+    orbit = np.zeros((2, 4))
+
+    for _ in range(50):
+        orbit = orbit.copy()
+        orbit[:, 0] = rng.normal(0, 1, 2)
+        snapshot = acquisition._publish(orbit, np.nan, changed=changed)
+
+    # readings that never changed are not samples
+    assert np.all(snapshot.jitter[:, 0] > 0)
+    assert np.all(acquisition.jitter.count[:, 1:] == 0)
+    assert not snapshot.jitter.flags.writeable
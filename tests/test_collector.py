@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def acquisition():
+    pytest.importorskip("lume_model")
+    pytest.importorskip("lume_epics")
+
+    from lcls_orbit.acquisition import OrbitAcquisition
+    from lcls_orbit.lattice import build_bpm_lattice
+    from lcls_orbit.simulation import BPMSimulator, SimulatedController
+
+    devices = tuple(f"BPMS:HXR:{i}" for i in range(8))
+    lattice = build_bpm_lattice(devices, tuple(np.linspace(2000.0, 3700.0, len(devices)).tolist()))
+    simulator = BPMSimulator(devices, update_rate=1000.0, seed=0)
+
+    class FrozenController(SimulatedController):
+        # the first BPM holds its reading forever
+        def get_value(self, pvname):
+            if pvname.startswith(f"{devices[0]}:"):
+                return 1.0
+
+            return super().get_value(pvname)
+
+    return OrbitAcquisition(lattice.table, FrozenController(simulator))
+
+
+def test_collection_ignores_frozen_devices(acquisition):
+    from lcls_orbit.collector import ReferenceCollector
+
+    published = []
+    acquisition.subscribe(published.append)
+
+    collector = ReferenceCollector(acquisition, 5, timeout=30.0, stale_timeout=0.2)
+    collector.start()
+
+    assert collector.wait(5.0)
+    assert not collector.cancelled
+
+    # the collection reads privately, other subscribers see no snapshots
+    assert published == []
+
+    reference = collector.reference()
+    assert np.all(reference.count[:, 0] == 1)
+    assert np.all(reference.count[:, 1:] == 5)
+
+
+def test_collection_does_not_hold_up_polls(acquisition):
+    from lcls_orbit.collector import ReferenceCollector
+
+    collector = ReferenceCollector(acquisition, 1000, timeout=0.5)
+
+    # the shared read lock stays free while the collector reads
+    with acquisition._read_lock:
+        collector.start()
+        assert collector.wait(5.0)
+
+    assert collector.progress > 0
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from lcls_orbit.colors import ColorScale
+
+PALETTE = ("#000000", "#333333", "#666666", "#999999", "#cccccc")
+
+
+@pytest.fixture
+def scale():
+    # one palette entry per unit of value
+    return ColorScale(PALETTE, 0.0, 5.0)
+
+
+def test_encode_centers_palette_entries(scale):
+    encoded = scale.encode(np.array([0.0, 0.99, 1.0, 2.5, 4.99]))
+    np.testing.assert_array_equal(encoded, [0.5, 0.5, 1.5, 2.5, 4.5])
+
+
+def test_encode_palette_ends(scale):
+    # the upper extent belongs to the last entry, not one past it
+    encoded = scale.encode(np.array([scale.low, scale.high]))
+    np.testing.assert_array_equal(encoded, [0.5, len(PALETTE) - 0.5])
+
+
+def test_encode_clips_out_of_range_values(scale):
+    encoded = scale.encode(np.array([-1e9, -0.01, 5.01, 1e9, -np.inf, np.inf]))
+    np.testing.assert_array_equal(encoded, [0.5, 0.5, 4.5, 4.5, 0.5, 4.5])
+
+
+def test_encode_keeps_nan(scale):
+    encoded = scale.encode(np.array([np.nan, 1.0, np.nan]))
+    np.testing.assert_array_equal(np.isnan(encoded), [True, False, True])
+    assert encoded[1] == 1.5
+
+
+def test_encode_into_out(scale):
+    values = np.array([-1.0, 3.2, np.nan, 7.0])
+    out = np.empty(len(values), dtype=np.float32)
+
+    result = scale.encode(values, out=out)
+
+    assert result is out
+    np.testing.assert_array_equal(out, np.array([0.5, 3.5, np.nan, 4.5], dtype=np.float32))
+
+
+def test_update_rescales(scale):
+    scale.update(low=-5.0, high=5.0)
+    np.testing.assert_array_equal(scale.encode(np.array([-5.0, 0.0, 5.0])), [0.5, 2.5, 4.5])
+
+    scale.update(palette=PALETTE[:1])
+    np.testing.assert_array_equal(scale.encode(np.array([-5.0, 0.0, 5.0])), [0.5, 0.5, 0.5])
+
+
+@pytest.mark.parametrize("palette, low, high", [((), 0.0, 1.0), (PALETTE, 1.0, 1.0), (PALETTE, 2.0, 1.0)])
+def test_invalid_scale(palette, low, high):
+    with pytest.raises(ValueError):
+        ColorScale(palette, low, high)
+
+
+def test_mapper_spans_palette(scale):
+    pytest.importorskip("bokeh")
+
+    mapper = scale.mapper(nan_color="#ffffff")
+
+    assert list(mapper.palette) == list(PALETTE)
+    assert (mapper.low, mapper.high) == (0, len(PALETTE))
+    assert mapper.nan_color == "#ffffff"
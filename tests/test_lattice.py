@@ -0,0 +1,68 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from lcls_orbit.lattice import load_lattice
+
+LATTICE = """device_name,ele_key,s_position,z_position,length
+BPMS:IN20:221,MONITOR,1.0,2001.0,0.0
+QUAD:IN20:361,QUADRUPOLE,2.0,2002.0,0.1
+BPMS:IN20:371,MONITOR,3.0,2003.0,0.0
+,DRIFT,4.0,2004.0,1.0
+"""
+
+
+@pytest.fixture
+def lattice_file(tmp_path):
+    path = tmp_path / "lattice.csv"
+    path.write_text(LATTICE)
+    return str(path)
+
+
+def compiled(cache_dir):
+    return sorted(name for name in os.listdir(cache_dir) if name.endswith(".npy"))
+
+
+def test_cold_load_compiles_lattice(lattice_file, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    lattice = load_lattice(lattice_file, cache_dir=cache_dir)
+
+    assert lattice["device_name"].tolist() == ["BPMS:IN20:221", "QUAD:IN20:361", "BPMS:IN20:371", ""]
+    np.testing.assert_array_equal(lattice["z_position"], [2001.0, 2002.0, 2003.0, 2004.0])
+    assert not lattice.flags.writeable
+
+    files = compiled(cache_dir)
+    assert len(files) == 1 and files[0].startswith("lattice.")
+    np.testing.assert_array_equal(np.load(os.path.join(cache_dir, files[0])), lattice)
+
+
+def test_warm_load_does_not_import_pandas(lattice_file, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    cold = load_lattice(lattice_file, cache_dir=cache_dir)
+
+    # any import of pandas now raises
+    monkeypatch.setitem(sys.modules, "pandas", None)
+    warm = load_lattice(lattice_file, cache_dir=cache_dir)
+
+    assert isinstance(warm, np.memmap)
+    np.testing.assert_array_equal(warm, cold)
+
+    with pytest.raises(ImportError):
+        load_lattice(lattice_file, cache_dir=None)
+
+
+def test_changed_csv_is_compiled_again(lattice_file, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    load_lattice(lattice_file, cache_dir=cache_dir)
+    before = compiled(cache_dir)
+
+    with open(lattice_file, "a") as f:
+        f.write("BPMS:IN20:425,MONITOR,5.0,2005.0,0.0\n")
+
+    lattice = load_lattice(lattice_file, cache_dir=cache_dir)
+
+    assert lattice["device_name"][-1] == "BPMS:IN20:425"
+    after = compiled(cache_dir)
+    assert len(after) == 1 and after != before
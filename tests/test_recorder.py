@@ -0,0 +1,68 @@
+import threading
+
+import numpy as np
+import pytest
+
+from lcls_orbit.acquisition import OrbitSnapshot
+from lcls_orbit.recorder import OrbitRecorder
+
+DEVICES = ("BPM1", "BPM2", "BPM3")
+Z = np.array([1.0, 2.0, 3.0])
+
+
+def snapshots(n, seed=0):
+    rng = np.random.default_rng(seed)
+    for i in range(n):
+        orbit = rng.normal(0, 1, (2, len(DEVICES)))
+        orbit[0, i % len(DEVICES)] = np.nan
+        yield OrbitSnapshot(
+            devices=DEVICES, z=Z, orbit=orbit, shading=float(i), timestamp=1000.0 + i, sequence=i + 1
+        )
+
+
+def test_writer_failure_stops_recording(tmp_path):
+    recorder = OrbitRecorder(str(tmp_path / "recording"), DEVICES, Z, chunk_size=1, max_queue=4)
+
+    def fail(chunk):
+        raise OSError("disk full")
+
+    recorder._writer.append = fail
+    for snapshot in snapshots(20):
+        recorder.record(snapshot)
+
+    recorder._thread.join(5)
+    assert recorder.failed
+    assert not recorder.running
+
+    closed = threading.Event()
+    thread = threading.Thread(target=lambda: (recorder.close(), closed.set()), daemon=True)
+    thread.start()
+    assert closed.wait(5)
+
+
+@pytest.mark.parametrize("name", ["recording", "recording.h5"])
+def test_recording_round_trip(tmp_path, name):
+    from lcls_orbit.replay import OrbitRecording
+
+    if name.endswith(".h5"):
+        pytest.importorskip("h5py")
+
+    path = str(tmp_path / name)
+    recorded = list(snapshots(10))
+    with OrbitRecorder(path, DEVICES, Z, chunk_size=4) as recorder:
+        for snapshot in recorded:
+            recorder.record(snapshot)
+
+    assert recorder.recorded == 10
+    assert recorder.dropped == 0
+
+    recording = OrbitRecording(path)
+    assert len(recording) == 10
+    assert recording.devices == DEVICES
+    np.testing.assert_array_equal(recording.z, Z)
+
+    # reads spanning chunks
+    np.testing.assert_array_equal(recording.read("orbit", 2, 9), [snapshot.orbit for snapshot in recorded[2:9]])
+    np.testing.assert_array_equal(recording.read("valid", 0, 10), [~np.isnan(s.orbit) for s in recorded])
+    np.testing.assert_array_equal(recording.read("sequence", 0, 10), np.arange(1, 11))
+    recording.close()
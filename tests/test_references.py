@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from lcls_orbit.references import Reference, ReferenceStore, zero_reference
+
+DEVICES = ("BPM1", "BPM2", "BPM3")
+
+
+@pytest.fixture
+def reference():
+    samples = np.array(
+        [
+            [[1.0, 2.0, np.nan], [3.0, np.nan, np.nan]],
+            [[0.0, 1.0, np.nan], [0.0, 3.0, np.nan]],
+        ]
+    )
+    return Reference.from_samples(DEVICES, samples, tag="test")
+
+
+def test_reference_from_samples(reference):
+    np.testing.assert_array_equal(reference.orbit, [[2.0, 2.0, 0.0], [0.0, 2.0, 0.0]])
+    np.testing.assert_array_equal(reference.std[:, :2], [[1.0, 0.0], [0.0, 1.0]])
+    assert np.all(np.isnan(reference.std[:, 2]))
+    np.testing.assert_array_equal(reference.count, [[2, 1, 0], [2, 2, 0]])
+    assert reference.metadata["tag"] == "test"
+    assert not reference.orbit.flags.writeable
+
+
+def test_reference_aligned(reference):
+    devices = ("BPM3", "BPM1", "BPM4")
+    aligned = reference.aligned(devices, {device: i for i, device in enumerate(devices)})
+
+    np.testing.assert_array_equal(aligned.orbit, [[0.0, 2.0, 0.0], [0.0, 0.0, 0.0]])
+    np.testing.assert_array_equal(aligned.count, [[0, 2, 0], [0, 2, 0]])
+    assert reference.aligned(DEVICES, {}) is reference
+    assert zero_reference(DEVICES).is_zero
+
+
+def test_reference_store(tmp_path, reference):
+    path = str(tmp_path / "references.sqlite")
+    store = ReferenceStore(path, cache_size=2)
+
+    stored = store.save(reference, "hxr", timestamp=1.0, tag="golden")
+    newer = store.save(reference, "hxr", timestamp=2.0)
+    store.save(reference, "sxr", timestamp=3.0)
+
+    assert [info.id for info in store.list("hxr")] == [newer.metadata["id"], stored.metadata["id"]]
+    assert store.list("hxr")[1].tag == "golden"
+    assert store.load(newer.metadata["id"]) is newer
+
+    # evicted from the cache, read from the database
+    loaded = store.load(stored.metadata["id"])
+    assert loaded is not stored
+    assert loaded.devices == DEVICES
+    np.testing.assert_array_equal(loaded.orbit, reference.orbit)
+    np.testing.assert_array_equal(loaded.std, reference.std)
+    np.testing.assert_array_equal(loaded.count, reference.count)
+    assert loaded.metadata["tag"] == "golden"
+
+    # other stores of the same database see the saved references
+    other = ReferenceStore(path)
+    assert len(other.list("hxr")) == 2
+
+    store.delete(stored.metadata["id"])
+    with pytest.raises(KeyError):
+        store.load(stored.metadata["id"])
+
+    store.close()
+    other.close()
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from lcls_orbit.acquisition import OrbitSnapshot
+from lcls_orbit.recorder import OrbitRecorder
+
+DEVICES = ("BPM1", "BPM2", "BPM3")
+Z = np.array([1.0, 2.0, 3.0])
+
+
+@pytest.fixture
+def recording(tmp_path):
+    pytest.importorskip("lume_model")
+
+    rng = np.random.default_rng(0)
+    recorded = [
+        OrbitSnapshot(
+            devices=DEVICES,
+            z=Z,
+            orbit=rng.normal(0, 1, (2, len(DEVICES))),
+            shading=float(i),
+            timestamp=1000.0 + i,
+            sequence=i + 1,
+        )
+        for i in range(6)
+    ]
+
+    path = str(tmp_path / "recording")
+    with OrbitRecorder(path, DEVICES, Z, chunk_size=4) as recorder:
+        for snapshot in recorded:
+            recorder.record(snapshot)
+
+    return path, recorded
+
+
+def test_replay_publishes_recorded_shots(recording):
+    from lcls_orbit.replay import ReplayAcquisition
+
+    path, recorded = recording
+    acquisition = ReplayAcquisition(path, speed=None)
+    assert acquisition.devices == DEVICES
+    assert np.isnan(acquisition.read()[0]).all()
+
+    for snapshot in recorded:
+        replayed = acquisition.poll()
+        np.testing.assert_array_equal(replayed.orbit, snapshot.orbit)
+        assert replayed.shading == snapshot.shading
+        assert replayed.timestamp == snapshot.timestamp
+
+    assert acquisition.finished
+    assert acquisition.poll() is replayed
+    np.testing.assert_array_equal(acquisition.read()[0], recorded[-1].orbit)
+
+
+@pytest.mark.parametrize("named", [True, False])
+def test_replay_shades_bars(recording, named):
+    pytest.importorskip("lume_epics")
+
+    from lume_model.variables import ScalarOutputVariable
+
+    from lcls_orbit import HXR_COLORS
+    from lcls_orbit.replay import ReplayAcquisition
+    from lcls_orbit.widgets import OrbitDisplay
+
+    path, recorded = recording
+    shading_var = ScalarOutputVariable(name="GDET:FEE1:241:ENRC")
+    acquisitions = {beamline: ReplayAcquisition(path, shading_var if named else None, speed=None) for beamline in ("hxr", "sxr")}
+    table = acquisitions["hxr"].table
+
+    display = OrbitDisplay(
+        table, table, shading_var, shading_var, color_var=shading_var, color_map=HXR_COLORS, extents=[0, 5],
+        acquisitions=acquisitions,
+    )
+    display.update(acquisitions["hxr"].poll())
+    display.update(acquisitions["hxr"].poll())
+
+    # the recorded shading is drawn, whether or not the replay names its PV
+    colors = display._source.data["color"]
+    assert display._shading_value == recorded[1].shading
+    assert not np.isnan(colors).any()
+
+
+def test_replay_can_not_replace_table(recording):
+    from lcls_orbit.replay import ReplayAcquisition
+
+    acquisition = ReplayAcquisition(recording[0], speed=None)
+    with pytest.raises(ValueError):
+        acquisition.with_table(acquisition.table)
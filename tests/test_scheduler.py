@@ -0,0 +1,169 @@
+import pytest
+
+from lcls_orbit import scheduler
+from lcls_orbit.scheduler import BACKOFF, SPEEDUP, RenderScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeDocument:
+    """Runs timeout callbacks on demand, advancing the clock to their due time."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.callbacks = {}
+        self.session_destroyed = []
+        self._handles = 0
+
+    def add_timeout_callback(self, callback, timeout):
+        self._handles += 1
+        self.callbacks[self._handles] = (callback, self.clock.now + timeout / 1000)
+        return self._handles
+
+    def remove_timeout_callback(self, handle):
+        if self.callbacks.pop(handle, None) is None:
+            raise ValueError("callback already ran")
+
+    def on_session_destroyed(self, callback):
+        self.session_destroyed.append(callback)
+
+    def run(self, lag=0.0):
+        (handle, (callback, due)), = self.callbacks.items()
+        del self.callbacks[handle]
+        self.clock.now = due + lag
+        callback()
+
+
+class FakeMetrics:
+    def __init__(self):
+        self.counts = {}
+
+    def record(self, name, value):
+        pass
+
+    def count(self, name):
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+
+class FakeDisplay:
+    """Display whose orbit changes when told and whose updates take cost seconds."""
+
+    def __init__(self, clock, cost=0.01):
+        self.clock = clock
+        self.cost = cost
+        self.changed = True
+        self.updates = 0
+        self.refresh_docs = []
+        self.metrics = FakeMetrics()
+        self.acquisition = self
+
+    def snapshot(self):
+        return object()
+
+    def has_changed(self, snapshot, deadband):
+        return self.changed
+
+    def update(self, snapshot):
+        self.clock.now += self.cost
+        self.updates += 1
+
+    def add_refresh_callbacks(self, doc):
+        self.refresh_docs.append(doc)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def doc(clock):
+    return FakeDocument(clock)
+
+
+def test_unchanged_orbit_is_skipped(clock, doc):
+    display = FakeDisplay(clock)
+    render = RenderScheduler(display, doc, target_period=0.5)
+    render.start()
+
+    assert display.refresh_docs == [doc]
+
+    doc.run()
+    display.changed = False
+    for _ in range(3):
+        doc.run()
+
+    assert display.updates == 1
+    assert render.stats()["ticks"] == 1
+    assert render.stats()["skipped"] == 3
+    assert display.metrics.counts == {"skipped": 3}
+    assert render.period == 0.5
+
+
+def test_expensive_updates_back_off(clock, doc):
+    display = FakeDisplay(clock, cost=0.2)
+    render = RenderScheduler(display, doc, target_period=0.5, max_period=5.0, load_fraction=0.2)
+    render.start()
+
+    doc.run()
+    assert render.cost == pytest.approx(0.2)
+    assert render.period == pytest.approx(1.0)
+
+    # the period never exceeds max_period
+    display.cost = 2.0
+    for _ in range(10):
+        doc.run()
+    assert render.period == 5.0
+
+
+def test_late_ticks_back_off(clock, doc):
+    display = FakeDisplay(clock, cost=0.0)
+    render = RenderScheduler(display, doc, target_period=0.5, max_lag=0.1)
+    render.start()
+
+    doc.run(lag=0.3)
+    assert render.lag == pytest.approx(0.3)
+    assert render.period == pytest.approx(0.5 * BACKOFF)
+
+    # lag within max_lag does not back off further
+    doc.run(lag=0.05)
+    assert render.period == pytest.approx(0.5 * BACKOFF * SPEEDUP)
+
+
+def test_period_converges_to_target(clock, doc):
+    display = FakeDisplay(clock, cost=0.2)
+    render = RenderScheduler(display, doc, target_period=0.5, load_fraction=0.2)
+    render.start()
+
+    for _ in range(3):
+        doc.run()
+    assert render.period > 1.0
+
+    display.cost = 0.001
+    periods = []
+    for _ in range(40):
+        doc.run()
+        periods.append(render.period)
+
+    assert all(later <= earlier for earlier, later in zip(periods, periods[1:]))
+    assert render.period == 0.5
+
+
+def test_stop_cancels_the_next_tick(clock, doc):
+    render = RenderScheduler(FakeDisplay(clock), doc)
+    render.start()
+    assert render.running and len(doc.callbacks) == 1
+
+    doc.session_destroyed[0](None)
+    assert not render.running and not doc.callbacks
+
+    # stopping twice is harmless
+    render.stop()
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from lcls_orbit.statistics import ExponentialStatistics, RunningStatistics, WindowedStatistics
+
+
+@pytest.fixture
+def samples():
+    rng = np.random.default_rng(0)
+    samples = rng.normal(1.0, 2.0, (40, 2, 5))
+    samples[rng.random(samples.shape) < 0.2] = np.nan
+    samples[:, 1, 4] = np.nan
+    return samples
+
+
+def test_running_statistics_match_numpy(samples):
+    statistics = RunningStatistics((2, 5))
+    for sample in samples:
+        statistics.update(sample)
+
+    with np.errstate(invalid="ignore"), pytest.warns(RuntimeWarning):
+        np.testing.assert_allclose(statistics.mean[:, :4], np.nanmean(samples, axis=0)[:, :4])
+        np.testing.assert_allclose(statistics.std, np.nanstd(samples, axis=0))
+        np.testing.assert_array_equal(statistics.min[:, :4], np.nanmin(samples, axis=0)[:, :4])
+        np.testing.assert_array_equal(statistics.max[:, :4], np.nanmax(samples, axis=0)[:, :4])
+
+    np.testing.assert_array_equal(statistics.count, np.count_nonzero(~np.isnan(samples), axis=0))
+    assert statistics.count[1, 4] == 0
+
+
+def test_windowed_statistics_match_last_window(samples):
+    statistics = WindowedStatistics((2, 5), window=8)
+    for sample in samples:
+        statistics.update(sample)
+
+    window = samples[-8:]
+    with pytest.warns(RuntimeWarning):
+        np.testing.assert_allclose(statistics.std, np.nanstd(window, axis=0))
+        np.testing.assert_array_equal(statistics.min, np.nanmin(window, axis=0))
+        np.testing.assert_array_equal(statistics.max, np.nanmax(window, axis=0))
+
+    np.testing.assert_array_equal(statistics.count, np.count_nonzero(~np.isnan(window), axis=0))
+
+
+def test_exponential_statistics():
+    statistics = ExponentialStatistics(3, alpha=0.5)
+
+    # the first sample is the mean, NaN samples are ignored
+    statistics.update([1.0, 2.0, np.nan])
+    statistics.update([1.0, np.nan, np.nan])
+    np.testing.assert_array_equal(statistics.mean[:2], [1.0, 2.0])
+    np.testing.assert_array_equal(statistics.std[:2], [0.0, 0.0])
+    np.testing.assert_array_equal(statistics.count, [2, 1, 0])
+    assert np.isnan(statistics.std[2])
+
+    statistics.update([3.0, 2.0, 5.0])
+    assert statistics.mean[0] == 2.0
+    assert statistics.variance[0] == pytest.approx(0.5 * (0 + 2.0 * 1.0))
+    assert statistics.mean[2] == 5.0
+
+    with pytest.raises(ValueError):
+        ExponentialStatistics(3, alpha=0)
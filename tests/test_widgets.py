@@ -0,0 +1,241 @@
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def display(make_display):
+    display, doc = make_display()
+    display.update()
+
+    events = []
+    doc.on_change(events.append)
+
+    return display, events
+
+
+def kinds(events):
+    # column changes reach document callbacks as model changes with a hint
+    return [type(getattr(event, "hint", None) or event) for event in events]
+
+
+def serialize(events):
+    from bokeh.protocol import Protocol
+
+    return Protocol().create("PATCH-DOC", events)
+
+
+def push(display, **changes):
+    columns = {name: np.array(display._pushed[name]) for name in ("x", "y", "color", "rms_x", "rms_y")}
+    for name, (idx, value) in changes.items():
+        columns[name][idx] = value
+
+    display._push(display._source, display._pushed, columns)
+
+
+def test_push_patches_few_changes(display):
+    from bokeh.document.events import ColumnsPatchedEvent
+
+    display, events = display
+    push(display, x=([1, 2, 6], [0.5, -0.5, 1.5]))
+
+    # one slice per run of consecutive entries
+    assert kinds(events) == [ColumnsPatchedEvent]
+    patches = events[0].hint.patches["x"]
+    assert [index for index, _ in patches] == [slice(1, 3), slice(6, 7)]
+    assert [list(values) for _, values in patches] == [[0.5, -0.5], [1.5]]
+    assert list(display._source.data["x"][[1, 2, 6]]) == [0.5, -0.5, 1.5]
+    serialize(events)
+
+
+def test_push_replaces_many_changes(display):
+    from bokeh.document.events import ColumnDataChangedEvent
+
+    display, events = display
+    push(display, y=(slice(None), 1.0))
+
+    assert kinds(events) == [ColumnDataChangedEvent]
+    assert events[0].hint.cols == ["y"]
+    serialize(events)
+
+
+def test_push_patches_nan(display):
+    from bokeh.document.events import ColumnsPatchedEvent
+
+    display, events = display
+    push(display, x=([1, 2], [0.5, np.nan]), color=([3], np.nan))
+
+    assert kinds(events) == [ColumnsPatchedEvent]
+    assert sorted(events[0].hint.patches) == ["color", "x"]
+    assert np.isnan(display._source.data["x"][2])
+    assert '"NaN"' in serialize(events).content_json
+
+
+def test_push_skips_unchanged_missing_readings(display):
+    display, events = display
+    push(display, x=([4], np.nan))
+    events.clear()
+
+    push(display, x=([4], np.nan))
+
+    assert events == []
+
+
+
+def test_update_with_few_changed_readings(display):
+    # a monitor style snapshot where only some readings changed, one went missing
+    display, events = display
+    acquisition = display.acquisition
+    orbit = np.array(acquisition.latest.orbit)
+    changed = np.zeros(orbit.shape, dtype=bool)
+    changed[:, [3, 7]] = True
+    orbit[:, 3] += 0.1
+    orbit[0, 7] = np.nan
+
+    orbit.setflags(write=False)
+    changed.setflags(write=False)
+    display.update(acquisition._publish(orbit, acquisition.latest.shading, changed=changed))
+
+    assert events
+    serialize(events)
+
+
+def test_waterfall_sends_newest_row(make_display):
+    from bokeh.document.events import ColumnDataChangedEvent
+
+    display, doc = make_display(history_n=5)
+    simulator = display.acquisition.controller.simulator
+    display.update()
+
+    events = []
+    doc.on_change(events.append)
+
+    for _ in range(7):
+        simulator.step()
+        display.update()
+
+    # one binary row per plane and update, nothing else of the waterfalls
+    source = display._waterfall_sources[0]
+    changes = [event.hint for event in events if getattr(event.hint, "column_source", None) in display._waterfall_sources]
+    assert len(changes) == 2 * 7
+    assert all(isinstance(change, ColumnDataChangedEvent) and sorted(change.cols) == ["index", "row"] for change in changes)
+    message = serialize(events)
+    assert len(message.buffers) >= 2 * 7
+
+    # shot k before the newest is drawn at -k, from the ring row newest - k
+    history = display._state.history
+    image = source.data["image"][0]
+    newest = history.newest
+    assert source.data["index"] == [newest]
+    assert source.data["y"][0] == -newest - 0.5
+    chronological = history.orbits()[0]
+    for k in range(history.capacity):
+        np.testing.assert_array_equal(image[(newest - k) % history.capacity], chronological[-1 - k])
+
+
+def test_colormap_is_private_to_the_display(make_display):
+    from lume_model.variables import ScalarOutputVariable
+
+    from lcls_orbit import SXR_COLORS
+
+    display, _ = make_display()
+    acquisition = display.acquisition
+    shading_var = acquisition.shading_var
+
+    # the simulator serves no such PV, so the bars lose their shading
+    display.update_colormap(ScalarOutputVariable(name="OTHER:SHADING"), SXR_COLORS, [0, 5])
+    display.update()
+    assert acquisition.shading_var is shading_var
+    assert np.isnan(display._source.data["color"]).all()
+
+    display.update_colormap(shading_var, SXR_COLORS, [0, 5])
+    display.update()
+    assert display._shading_value == acquisition.latest.shading
+    assert not np.isnan(display._source.data["color"]).any()
+
+
+def test_update_table_replaces_shared_acquisition(make_display):
+    from lcls_orbit.acquisition import _shared_acquisitions, shared_acquisition
+
+    display, _ = make_display()
+    acquisition = display.acquisition
+    acquisition.threaded = True
+    shared = shared_acquisition("test-update-table", lambda: acquisition)
+
+    try:
+        display.update_table(acquisition.table)
+        replacement = display.acquisition
+
+        # same kind and controller, shared and polled in the background
+        assert type(replacement) is type(acquisition)
+        assert replacement is not shared
+        assert replacement.controller is acquisition.controller
+        assert replacement.running
+        assert _shared_acquisitions[f"test-update-table:{id(acquisition.table)}"] is replacement
+        display.update()
+
+    finally:
+        for key in [key for key in _shared_acquisitions if key.startswith("test-update-table")]:
+            _shared_acquisitions.pop(key).stop()
+
+
+def test_toggle_keeps_beamline_state(make_display):
+    from lcls_orbit.references import Reference
+
+    display, _ = make_display()
+    display.update()
+    hxr = display._state
+
+    reference = Reference.from_samples(hxr.devices, np.ones((2, 1, len(hxr.devices))))
+    display._swap_reference(reference)
+
+    display.toggle_beamline("sxr")
+    display.update()
+    assert display._state is not hxr
+    assert display._state.active_reference.is_zero
+
+    display.toggle_beamline("hxr")
+    assert display._state is hxr
+    assert display._state.active_reference is reference
+
+
+def test_references_of_other_sessions_are_listed(make_display):
+    from lcls_orbit.references import ReferenceStore
+    from lcls_orbit.widgets import REFERENCES_PERIOD
+
+    store = ReferenceStore(":memory:")
+    display, doc = make_display(reference_store=store)
+    other, _ = make_display(reference_store=store)
+    assert display.compare_reference_dropdown.menu == []
+
+    # refreshed by a periodic callback, independent of updates
+    display.add_refresh_callbacks(doc)
+    display.add_refresh_callbacks(doc)
+    callbacks = doc.session_callbacks
+    assert len(callbacks) == 1
+    assert callbacks[0].period == REFERENCES_PERIOD * 1000
+
+    other.reference_tag_input.value = "golden"
+    other._save_reference()
+    callbacks[0].callback()
+    assert len(display.compare_reference_dropdown.menu) == 1
+
+    # an unchanged menu is not sent again
+    events = []
+    doc.on_change(events.append)
+    display.refresh_references()
+    assert events == []
+
+
+def test_diagnostics_refresh_while_idle(make_display):
+    from lcls_orbit.widgets import DIAGNOSTICS_PERIOD
+
+    display, doc = make_display(diagnostics=True)
+    display.add_refresh_callbacks(doc)
+
+    callbacks = {callback.period: callback for callback in doc.session_callbacks}
+    assert DIAGNOSTICS_PERIOD * 1000 in callbacks
+
+    # skipped ticks are shown although nothing was drawn
+    display.metrics.count("skipped")
+    callbacks[DIAGNOSTICS_PERIOD * 1000].callback()
+    assert "skipped" in display.diagnostics.text